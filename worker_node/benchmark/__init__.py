@@ -0,0 +1 @@
+#Benchmark do worker: problemas de referência (fixtures.py), gerador de carga (loadtest.py) e comparação de relatórios (compare.py)
@@ -0,0 +1,61 @@
+#Compara dois relatórios do loadtest (ex.: antes e depois de uma mudança):
+#  python -m benchmark.compare base.json atual.json
+from pathlib import Path
+import argparse
+import json
+import sys
+
+METRICS = [   #(nome exibido, caminho no resumo)
+    ("throughput_rps", ('throughput_rps',)),
+    ("latency_p50", ('latency_seconds', 'p50')),
+    ("latency_p95", ('latency_seconds', 'p95')),
+    ("latency_p99", ('latency_seconds', 'p99')),
+    ("subprocesses_per_request", ('subprocesses_per_request',)),
+    ("errors", ('errors',)),
+    ("mismatches", ('mismatches',)),
+]
+
+def _value(summary: dict, path: tuple):
+    for key in path:
+        if not isinstance(summary, dict):
+            return None
+        summary = summary.get(key)
+    return summary
+
+def _change(base, current):
+    if base is None or current is None:
+        return "n/a"
+    if base == 0:
+        return "=" if current == 0 else "new"
+    return f"{(current - base) / base * 100:+.1f}%"
+
+def compare_summaries(base: dict, current: dict, metrics: list = METRICS):   #Linhas (métrica, base, atual, variação)
+    return [(name, _value(base, path), _value(current, path), _change(_value(base, path), _value(current, path))) for name, path in metrics]
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Compare two load test reports")
+    parser.add_argument("base")
+    parser.add_argument("current")
+    args = parser.parse_args(argv)
+    base = json.loads(Path(args.base).read_text())
+    current = json.loads(Path(args.current).read_text())
+
+    print(f"base:    {base.get('git_commit')} ({base['config']['requests']} requests, concurrency {base['config']['concurrency']})")
+    print(f"current: {current.get('git_commit')} ({current['config']['requests']} requests, concurrency {current['config']['concurrency']})")
+    if base['config']['fixtures'] != current['config']['fixtures']:
+        print("warning: the reports used different fixtures", file=sys.stderr)
+
+    sections = [("total", base['summary'], current['summary'])]
+    for name in base['fixtures']:
+        if name in current['fixtures']:
+            sections.append((name, base['fixtures'][name], current['fixtures'][name]))
+    for section, baseSummary, currentSummary in sections:
+        print(f"\n[{section}]")
+        for name, baseValue, currentValue, change in compare_summaries(baseSummary, currentSummary):
+            if baseValue is None and currentValue is None:
+                continue
+            print(f"  {name:<26}{str(baseValue):>12}{str(currentValue):>12}{change:>10}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
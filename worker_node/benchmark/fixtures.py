@@ -0,0 +1,77 @@
+#Submissões de referência usadas pelo gerador de carga. Cada linguagem tem o mesmo problema (soma de dois inteiros) com uma
+#submissão de cada tipo. "kind" é o veredito esperado, conferido pelo loadtest em cada resposta:
+#  correct - todos os casos corretos
+#  wrong_answer - algum caso com saída diferente da do professor
+#  runtime_error - erro durante a execução de um caso de teste
+#  tle - o caso de teste estourou o tempo limite
+#  flagged - barrada na análise de segurança (Bandit em Python, blacklist em C e Julia)
+
+TEST_CASES = ["[1, 2]", "[3, 4]", "[-5, 5]", "[100, 250]"]
+
+PROBLEMS = {   #Definição do problema enviada junto de cada submissão, por linguagem
+    "Python": {
+        'func': "soma",
+        'return_type': "",
+        'professor_code': "def soma(a, b):\n    return a + b\n",
+    },
+    "C": {
+        'func': "soma",
+        'return_type': "int",
+        'professor_code': "int soma(int a, int b){\n    return a + b;\n}\n",
+    },
+    "Julia": {
+        'func': "soma",
+        'return_type': "",
+        'professor_code': "function soma(a, b)\n    return a + b\nend\n",
+    },
+}
+
+SUBMISSIONS = {   #linguagem -> tipo -> código do aluno
+    "Python": {
+        'correct': "def soma(a, b):\n    total = a + b\n    return total\n",
+        'wrong_answer': "def soma(a, b):\n    return a - b\n",
+        'runtime_error': "def soma(a, b):\n    return (a + b) / 0\n",
+        'tle': "def soma(a, b):\n    while True:\n        pass\n",
+        'flagged': "def soma(a, b):\n    return eval(str(a) + '+' + str(b))\n",   #B307 (eval)
+    },
+    "C": {
+        'correct': "int soma(int a, int b){\n    int total = a + b;\n    return total;\n}\n",
+        'wrong_answer': "int soma(int a, int b){\n    return a - b;\n}\n",
+        'runtime_error': "int soma(int a, int b){\n    int v[2] = {0, 1};\n    volatile int k = a + b + 100000;\n    return v[k];\n}\n",
+        'tle': "int soma(int a, int b){\n    volatile int k = 0;\n    while (1) { k++; }\n    return a + b;\n}\n",
+        'flagged': "int soma(int a, int b){\n    system(\"ls\");\n    return a + b;\n}\n",
+    },
+    "Julia": {
+        'correct': "function soma(a, b)\n    total = a + b\n    return total\nend\n",
+        'wrong_answer': "function soma(a, b)\n    return a - b\nend\n",
+        'runtime_error': "function soma(a, b)\n    return [a, b][a + b + 10]\nend\n",
+        'tle': "function soma(a, b)\n    while true\n    end\n    return a + b\nend\n",
+        'flagged': "using Sockets\nfunction soma(a, b)\n    return a + b\nend\n",
+    },
+}
+
+LANGUAGES = list(SUBMISSIONS)
+KINDS = ['correct', 'wrong_answer', 'runtime_error', 'tle', 'flagged']
+
+def fixture_name(lang: str, kind: str):
+    return f"{lang.lower()}_{kind}"
+
+def select_fixtures(languages: list = None, kinds: list = None):
+    #Lista de fixtures {'name', 'lang', 'kind', 'code', 'problem', 'test_cases'} filtradas por linguagem e tipo
+    fixtures = []
+    for lang in languages or LANGUAGES:
+        if lang not in SUBMISSIONS:
+            raise ValueError(f"Unknown language: {lang}")
+        for kind in kinds or KINDS:
+            if kind not in KINDS:
+                raise ValueError(f"Unknown submission kind: {kind}")
+            testCases = TEST_CASES[:1] if kind == 'tle' else TEST_CASES   #Um caso basta: o TLE encerra a avaliação
+            fixtures.append({
+                'name': fixture_name(lang, kind),
+                'lang': lang,
+                'kind': kind,
+                'code': SUBMISSIONS[lang][kind],
+                'problem': PROBLEMS[lang],
+                'test_cases': testCases,
+            })
+    return fixtures
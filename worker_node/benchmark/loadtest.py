@@ -0,0 +1,220 @@
+#Gerador de carga para o /multi_process. Envia as submissões de fixtures.py com a concorrência pedida e gera um relatório JSON
+#com vazão, latências (p50/p95/p99) e processos criados por requisição, para comparar versões do worker (compare.py).
+#Só acessa o servidor informado em --url, então roda sem rede contra um worker local:
+#  python -m benchmark.loadtest --url http://127.0.0.1:5000 --concurrency 8 --requests 200 --kinds correct,wrong_answer --output atual.json
+from benchmark.fixtures import LANGUAGES, KINDS, select_fixtures
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+import requests
+
+SPAWNS_REGEX = re.compile(r'^worker_subprocess_spawns_total\{[^}]*\}\s+([0-9.eE+-]+)$', re.MULTILINE)
+
+def build_archive(code: str):   #Mesmo formato do zip enviado pelo sistema web: o código do aluno no arquivo "run_me"
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w") as archive:
+        archive.writestr("run_me", code)
+    return buffer.getvalue()
+
+def classify(status: int, body):   #Veredito da resposta do /multi_process, no mesmo vocabulário dos tipos das fixtures
+    if status != 200:
+        return "error"
+    if isinstance(body, dict):
+        if body.get('pre_process_error'):
+            return "flagged" if body['code_status'] in (2, 3) else f"pre_process_{body['code_status']}"
+        return "error"
+    if not body:
+        return "error"
+    results = [resultItem['result'] for resultItem in body]
+    if any(result['code_output'].startswith("Time limit exceeded") for result in results):
+        return "tle"
+    if any(result['code_output'].startswith("Memory limit exceeded") for result in results):
+        return "memory_limit_exceeded"
+    if any(resultItem['status_code'] == 500 for resultItem in body):
+        return "error"
+    if any(resultItem['status_code'] == 400 for resultItem in body):
+        return "runtime_error"
+    if all(result['isCorrect'] for result in results):
+        return "correct"
+    return "wrong_answer"
+
+def percentile(values: list, p: float):   #Interpolação linear entre os valores ordenados (mesmo método padrão do numpy)
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(latencies: list):
+    if not latencies:
+        return None
+    return {
+        'mean': round(sum(latencies) / len(latencies), 6),
+        'p50': round(percentile(latencies, 50), 6),
+        'p95': round(percentile(latencies, 95), 6),
+        'p99': round(percentile(latencies, 99), 6),
+        'max': round(max(latencies), 6),
+    }
+
+def spawn_total(url: str, timeout: float):   #Soma de worker_subprocess_spawns_total no /metrics, ou None se o servidor não expõe as métricas
+    try:
+        response = requests.get(f"{url}/metrics", timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None
+    return sum(float(value) for value in SPAWNS_REGEX.findall(response.text))
+
+def git_commit():   #Versão do worker que gerou o relatório (None fora de um repositório git)
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10, cwd=Path(__file__).parent)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() or None
+
+
+class LoadTest():
+    def __init__(self, url: str, fixtures: list, concurrency: int, timeout: float, timings: bool):
+        self.url = url.rstrip("/")
+        self.fixtures = fixtures
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.timings = timings   #Pede debug_timings e conta os processos de cada resposta (mais preciso que o /metrics, mas ignora o cache de resultados)
+        self.__archives = {fixture['name']: build_archive(fixture['code']) for fixture in fixtures}
+        self.__sessions = threading.local()   #Uma conexão reaproveitada por thread
+
+    def submit(self, fixture: dict):   #Uma requisição ao /multi_process. Retorna a amostra medida
+        session = getattr(self.__sessions, "session", None)
+        if session is None:
+            session = self.__sessions.session = requests.Session()
+        problem = fixture['problem']
+        data = {
+            'prog_lang': fixture['lang'],
+            'problem_id': f"benchmark-{fixture['lang'].lower()}",
+            'professor_code': problem['professor_code'],
+            'func': problem['func'],
+            'return_type': problem['return_type'],
+            'test_cases': json.dumps(fixture['test_cases']),
+        }
+        if self.timings:
+            data['debug_timings'] = "true"
+        sample = {'fixture': fixture['name'], 'spawns': None}
+        start = time.monotonic()
+        try:
+            response = session.post(f"{self.url}/multi_process", data=data, files={'file': ("submission.zip", self.__archives[fixture['name']])}, timeout=self.timeout)
+            sample['latency'] = time.monotonic() - start
+            sample['status'] = response.status_code
+            body = response.json()
+        except (requests.RequestException, ValueError) as e:
+            sample['latency'] = time.monotonic() - start
+            sample['status'] = None
+            sample['verdict'] = "error"
+            sample['error'] = str(e)
+            return sample
+        if self.timings and response.status_code == 200:
+            sample['spawns'] = sum(entry['count'] for entry in body['timings']['subprocesses'].values())
+            body = body['response']
+        sample['verdict'] = classify(response.status_code, body)
+        return sample
+
+    def run(self, numRequests: int, warmup: int = 0):
+        schedule = [self.fixtures[index % len(self.fixtures)] for index in range(numRequests)]   #Ordem fixa: duas execuções enviam exatamente as mesmas requisições
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(self.submit, [self.fixtures[index % len(self.fixtures)] for index in range(warmup)]))
+            spawnsBefore = None if self.timings else spawn_total(self.url, self.timeout)
+            start = time.monotonic()
+            samples = list(executor.map(self.submit, schedule))
+            duration = time.monotonic() - start
+        spawnsAfter = None if spawnsBefore is None else spawn_total(self.url, self.timeout)
+
+        kinds = {fixture['name']: fixture['kind'] for fixture in self.fixtures}
+        summary = self.__summarize(samples, kinds)
+        summary['duration_seconds'] = round(duration, 6)
+        summary['throughput_rps'] = round(len(samples) / duration, 4) if duration > 0 else None
+        if spawnsAfter is not None and samples:   #Com vários processos do gunicorn, o /metrics só soma todos eles com PROMETHEUS_MULTIPROC_DIR
+            summary['subprocesses_per_request'] = round((spawnsAfter - spawnsBefore) / len(samples), 4)
+
+        perFixture = {}
+        for fixture in self.fixtures:
+            fixtureSamples = [sample for sample in samples if sample['fixture'] == fixture['name']]
+            if fixtureSamples:
+                perFixture[fixture['name']] = self.__summarize(fixtureSamples, kinds)
+        return {
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'config': {
+                'url': self.url,
+                'concurrency': self.concurrency,
+                'requests': numRequests,
+                'warmup': warmup,
+                'timings': self.timings,
+                'fixtures': [fixture['name'] for fixture in self.fixtures],
+                'client_cpu_count': os.cpu_count(),
+            },
+            'summary': summary,
+            'fixtures': perFixture,
+            'failures': [sample for sample in samples if sample['verdict'] != kinds[sample['fixture']]][:20],   #Algumas amostras para investigar
+        }
+
+    def __summarize(self, samples: list, kinds: dict):
+        summary = {
+            'requests': len(samples),
+            'errors': sum(1 for sample in samples if sample['verdict'] == "error"),
+            'mismatches': sum(1 for sample in samples if sample['verdict'] != kinds[sample['fixture']]),   #Veredito diferente do esperado pela fixture
+            'latency_seconds': latency_summary([sample['latency'] for sample in samples]),
+            'subprocesses_per_request': None,
+        }
+        spawns = [sample['spawns'] for sample in samples if sample['spawns'] is not None]
+        if spawns:
+            summary['subprocesses_per_request'] = round(sum(spawns) / len(spawns), 4)
+        return summary
+
+
+def _split(value: str):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Load test for the worker /multi_process endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="worker base URL (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at the same time (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=100, help="measured requests (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=0, help="requests sent before measuring (default: %(default)s)")
+    parser.add_argument("--languages", help=f"comma separated subset of {','.join(LANGUAGES)}")
+    parser.add_argument("--kinds", help=f"comma separated subset of {','.join(KINDS)}")
+    parser.add_argument("--timeout", type=float, default=120, help="per request timeout in seconds (default: %(default)s)")
+    parser.add_argument("--timings", action="store_true", help="count subprocesses from each response (debug_timings) instead of /metrics")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        fixtures = select_fixtures(_split(args.languages), _split(args.kinds))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.concurrency < 1 or args.requests < 1:
+        parser.error("--concurrency and --requests must be positive")
+
+    report = LoadTest(args.url, fixtures, args.concurrency, args.timeout, args.timings).run(args.requests, args.warmup)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    summary = report['summary']
+    print(f"{summary['requests']} requests, {summary['throughput_rps']} req/s, p50 {summary['latency_seconds']['p50']}s, "
+          f"p95 {summary['latency_seconds']['p95']}s, p99 {summary['latency_seconds']['p99']}s, "
+          f"{summary['errors']} errors, {summary['mismatches']} mismatches", file=sys.stderr)
+    return 0 if summary['errors'] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
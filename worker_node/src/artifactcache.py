@@ -0,0 +1,79 @@
+from utils import get_env_int
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+EVICTION_GRACE_SECONDS = 120   #Artefatos usados recentemente nunca são removidos, pois podem estar sendo ligados por outra execução
+
+class ArtifactCache():   #Cache de artefatos compilados endereçado pelo conteúdo. Fica em um diretório compartilhado por todos os processos do gunicorn
+    def __init__(self, directory: str, maxBytes: int):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.__failedKeys = set()   #Artefatos que não compilaram neste processo (não adianta tentar de novo)
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def get_or_build(self, key: str, suffix: str, build):   #build(caminho) gera o artefato no caminho recebido ou lança exceção. Retorna o caminho do artefato ou None
+        path = os.path.join(self.directory, key + suffix)
+        try:
+            os.utime(path)   #O mtime marca o último uso, usado na remoção por tamanho
+            return path
+        except FileNotFoundError:
+            pass
+        with self.__lock:
+            if key in self.__failedKeys:
+                return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=suffix)
+        os.close(fd)
+        try:
+            build(tmpPath)
+            os.replace(tmpPath, path)   #Rename atômico: outro processo nunca enxerga um artefato pela metade
+        except Exception as e:
+            logging.info(f"Couldn't build cached artifact {key}{suffix}: {e}")
+            with self.__lock:
+                self.__failedKeys.add(key)
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            return None
+        self.__evict(path)
+        return path
+
+    def __evict(self, keepPath: str):   #Remove os artefatos usados há mais tempo até o diretório caber no limite
+        entries = []
+        totalBytes = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".tmp-") or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            totalBytes += stat.st_size
+
+        now = time.time()
+        for mtime, size, path in sorted(entries):
+            if totalBytes <= self.maxBytes:
+                break
+            if path == keepPath or now - mtime < EVICTION_GRACE_SECONDS:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            totalBytes -= size
+
+
+artifact_cache = ArtifactCache(
+    os.getenv("ARTIFACT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "worker-artifact-cache")),
+    get_env_int("ARTIFACT_CACHE_MAX_MB", 256) * 1024 * 1024,
+)
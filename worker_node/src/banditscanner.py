@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from pathlib import Path
+from bandit.core import config as b_config
+from bandit.core import manager as b_manager
+from utils import get_env_int
+import hashlib
+import threading
+
+SEVERITIES = ["HIGH", "MEDIUM", "LOW", "UNDEFINED"]
+
+def _config_path():   #No container o bandit_config.yml fica junto do código; localmente, na pasta worker_node
+    base_dir = Path(__file__).resolve().parent
+    if (base_dir / "bandit_config.yml").exists():
+        return base_dir / "bandit_config.yml"
+    return base_dir.parent / "bandit_config.yml"
+
+class BanditScanner():   #Roda o Bandit no próprio processo. Configuração e plugins são carregados uma única vez
+    def __init__(self, configPath: Path, cacheSize: int):
+        self.__config = b_config.BanditConfig(config_file=str(configPath))
+        self.__profile = {   #Mesmo perfil que o "bandit -c" monta a partir das opções tests/skips do arquivo
+            "include": set(self.__config.get_option("tests") or []),
+            "exclude": set(self.__config.get_option("skips") or []),
+        }
+        self.cacheSize = cacheSize
+        self.__results = OrderedDict()   #hash do código -> totais por severidade
+        self.__lock = threading.Lock()
+
+    def severity_totals(self, file_path: str):   #Mesmos valores de metrics["_totals"]["SEVERITY.*"] do relatório JSON do CLI
+        with open(file_path, "rb") as file:
+            codeHash = hashlib.sha256(file.read()).hexdigest()
+        with self.__lock:
+            totals = self.__results.get(codeHash)
+            if totals is not None:
+                self.__results.move_to_end(codeHash)
+                return totals
+
+        manager = b_manager.BanditManager(self.__config, "file", quiet=True, profile=self.__profile)   #Um manager por análise: ele acumula os resultados dos arquivos
+        manager.discover_files([file_path])
+        manager.run_tests()
+        totals = {severity: manager.metrics.data["_totals"][f"SEVERITY.{severity}"] for severity in SEVERITIES}
+
+        if self.cacheSize > 0:
+            with self.__lock:
+                self.__results[codeHash] = totals
+                while len(self.__results) > self.cacheSize:
+                    self.__results.popitem(last=False)
+        return totals
+
+
+_bandit_scanner = None
+_bandit_scanner_lock = threading.Lock()
+
+def get_bandit_scanner():   #Um scanner por processo do gunicorn, criado no primeiro uso
+    global _bandit_scanner
+    with _bandit_scanner_lock:
+        if _bandit_scanner is None:
+            _bandit_scanner = BanditScanner(_config_path(), get_env_int("BANDIT_CACHE_SIZE", 10000))
+        return _bandit_scanner
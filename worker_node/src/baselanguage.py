@@ -1,8 +1,19 @@
 class BaseLanguage():   #Aqui estarão métodos comuns para todas as linguagens suportadas
     def __init__(self, langExtension:str):
         self.langExtension = langExtension
+        self.supportsBatchMode = False   #Linguagens que sobrescrevem batch_code_with_args e run_batch_code devem mudar para True
+        self.parallelWorkers = 1   #Máximo de casos de teste executados ao mesmo tempo no modo paralelo
+        self.timings = None   #RequestTimings da submissão quando o cliente pede os tempos (debug_timings)
+        self.timeLimit = None   #Tempo limite (em segundos) de cada execução do código. Cada linguagem define o padrão, que pode ser reduzido por problema (ADAPTIVE_TIME_LIMIT)
+        self.defaultTimeLimit = None
     
-    def base_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, arg, returnType = ""):
+    def prepare_professor_code(self, professorCode: str, funcName: str, funcNameProf: str):   #Chamado uma vez por submissão, antes dos casos de teste
+        pass
+    
+    def base_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, arg, returnType = "", expectedOutput = None):
+        pass
+    
+    def batch_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, args: list, returnType = "", expectedOutputs = None):
         pass
     
     def professor_code_with_args(self, professorCode: str, funcName: str, funcNameProf: str, arg, returnType = ""):
@@ -11,7 +22,10 @@ class BaseLanguage():   #Aqui estarão métodos comuns para todas as linguagens
     def evaluate_file(self, absolute_path: str):
         pass
     
-    def run_code(self, file_path: str, isProfessorCode: bool):
+    def run_code(self, file_path: str, isProfessorCode: bool, usage: dict = None):   #usage, se informado, recebe o uso de recursos da execução
+        pass
+    
+    def run_batch_code(self, file_path: str, numTestCases: int, usages: list = None):
         pass
     
     def run_pre_process_code(self, file_path: str):
@@ -19,3 +33,6 @@ class BaseLanguage():   #Aqui estarão métodos comuns para todas as linguagens
     
     def pre_process_code(self, code: str, code_path: str):
         pass
+    
+    def reference_output(self, codeOutput: list):   #Entrada do cache de saídas do professor a partir do retorno de run_code
+        return {"output": codeOutput[2], "literal": None}
@@ -1,38 +1,66 @@
 from baselanguage import BaseLanguage
-from exceptions import CodeException, PrintException, DangerException
+from exceptions import CodeException, PrintException, DangerException, MemoryLimitException, InfrastructureException
 import os
 import subprocess
 import json
 import re
 import signal
-from utils import is_running_in_container
+from utils import is_running_in_container, get_env_int, get_env_flag
+from artifactcache import artifact_cache
+from codescanner import RuleScanner
+from metrics import observe_stage
+from timings import run_subprocess
+from resourcelimits import execution_limits
+
+TIME_LIMIT = 10   #Tempo limite (em segundos) para a execução de cada caso de teste
 
 class CLanguage(BaseLanguage):
     def __init__(self, langExtension:str):
         self.__offsetCodeLines = 5  #Offset de linhas que vêm antes do código do usuário
         self.__baseCodeLines = -1
+        self.__cachedProfessorOutputs = []
+        self.__professorPrototype = None   #Com o objeto do professor em cache, o código do aluno declara a função em vez de incluir o arquivo do professor
+        self.__professorObjectKey = None
+        self.__professorCode = None
+        self.__studentCode = None   #Código do aluno sem comentários, para conferir conflitos de nomes com o objeto do professor
         super().__init__(langExtension)
+        self.supportsBatchMode = True
+        self.parallelWorkers = get_env_int("C_PARALLEL_WORKERS", 4)
+        self.timeLimit = self.defaultTimeLimit = TIME_LIMIT
+    
+    def prepare_professor_code(self, professorCode: str, funcName: str, funcNameProf: str):
+        #Compila o código do professor uma única vez por problema em um objeto (.o) guardado no cache de artefatos
+        if not get_env_flag("C_PROFESSOR_OBJECT_CACHE", True):
+            return
+        baseProfCode = professorCode.replace(funcName, funcNameProf)
+        prototype = professor_prototype(baseProfCode, funcNameProf)
+        if prototype is None or not object_preserves_include(baseProfCode):   #Continua usando o #include
+            return
+        objectKey = artifact_cache.make_key("c-professor", PROFESSOR_PRELUDE, prototype, baseProfCode, compile_flags())
+        self.__professorCode = (baseProfCode, prototype, funcNameProf)
+        self.__professorObjectKey = objectKey
+        objectPath = self.__professor_object()
+        if objectPath is None:
+            return
+        #Com o #include, um nome do aluno igual a um nome global do professor (função auxiliar, variável) era um erro de redefinição, e o aluno podia
+        #usar as funções auxiliares do professor. Nesses casos a submissão continua com o #include, para dar o mesmo resultado
+        if self.__studentCode is not None and professor_symbols(objectPath) & set(IDENTIFIER_REGEX.findall(self.__studentCode)):
+            return
+        self.__professorPrototype = prototype
     
-    def base_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, arg, returnType = ""):
+    def base_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, arg, returnType = "", expectedOutput = None):
         if returnType == "":
             raise Exception
         argsTxt = extract_args(arg)
         self.__baseCodeLines = len(baseCode.splitlines())
         printf_returnType = formats_printf[returnType]
-        line_comparison = f'printf("%d\\n", {funcName}({argsTxt}) == {funcNameProf}({argsTxt}));'
-        
-        if printf_returnType == "%f" or printf_returnType == "%lf":    #Se o retorno for do tipo float ou double, a comparação será feita com uma tolerância
-            tolerancia = '0.0001'    #Tolerância
-            line_comparison = f'printf("%d\\n", fabs({funcName}({argsTxt}) - {funcNameProf}({argsTxt})) < {tolerancia});'
-            
-        if printf_returnType == "%s":  #Se o retorno for uma string, a comparação será feita com a função strcmp
-            line_comparison = f'printf("%d\\n", strcmp({funcName}({argsTxt}), {funcNameProf}({argsTxt})) == 0);'
+        line_comparison = comparison_line(funcName, funcNameProf, argsTxt, printf_returnType)
         
         resultArgs = f"""#include <stdio.h>
 #include <string.h>
 #include <stdlib.h>
 #include <math.h>
-#include "{name_file_professor}{self.langExtension}"
+{self.__professor_line(name_file_professor)}
 {baseCode}
 int main() {{
     {line_comparison}
@@ -40,6 +68,48 @@ int main() {{
     printf("{printf_returnType}", {funcNameProf}({argsTxt}));
     return 0;
 }}
+"""
+        return resultArgs
+    
+    def batch_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, args: list, returnType = "", expectedOutputs = None):
+        #Um único binário com todos os casos de teste: "./run_me <índice>" executa o caso e "./run_me <índice> prof" imprime apenas a saída do professor
+        if returnType == "":
+            raise Exception
+        self.__baseCodeLines = len(baseCode.splitlines())
+        self.__cachedProfessorOutputs = [expected is not None for expected in expectedOutputs] if expectedOutputs else [False] * len(args)
+        printf_returnType = formats_printf[returnType]
+        testCaseFunctions = ""
+        for index, arg in enumerate(args):
+            argsTxt = extract_args(arg)
+            line_comparison = comparison_line(funcName, funcNameProf, argsTxt, printf_returnType)
+            testCaseFunctions += f"""static void test_case_{index}(int onlyProfessor) {{
+    if (onlyProfessor) {{
+        printf("{printf_returnType}", {funcNameProf}({argsTxt}));
+        return;
+    }}
+    {line_comparison}
+    printf("{printf_returnType}\\n", {funcName}({argsTxt}));
+    printf("{printf_returnType}", {funcNameProf}({argsTxt}));
+}}
+"""
+        dispatchTable = ", ".join(f"test_case_{index}" for index in range(len(args)))
+        
+        resultArgs = f"""#include <stdio.h>
+#include <string.h>
+#include <stdlib.h>
+#include <math.h>
+{self.__professor_line(name_file_professor)}
+{baseCode}
+{testCaseFunctions}
+static void (*test_cases[])(int) = {{{dispatchTable}}};
+int main(int argc, char *argv[]) {{
+    int index = argc > 1 ? atoi(argv[1]) : -1;
+    if (index < 0 || index >= {len(args)}) {{
+        return 2;
+    }}
+    test_cases[index](argc > 2 && strcmp(argv[2], "prof") == 0);
+    return 0;
+}}
 """
         return resultArgs
     
@@ -59,48 +129,57 @@ int main(){{
     def evaluate_file(self, absolute_path: str):        #Sem verificações para C
         return
     
-    def run_code(self, file_path: str, isProfessorCode: bool):
-        exec_file_path = compile_code(file_path, self.__offsetCodeLines, self.__baseCodeLines)
-        run_result = subprocess.run([exec_file_path], capture_output=True, text=True, timeout=10)
-        if run_result.stderr != "":
-            error_msg = process_runtime_errors(run_result.stderr, self.__offsetCodeLines)
-            if error_msg == "":
-                error_msg = run_result.stderr
-            raise CodeException(error_msg)
-        if run_result.returncode != 0:
-            signal_number = -run_result.returncode
-            signal_name = signal.Signals(signal_number).name
-            msg_error = ""
-            msg_error += f"RUNTIME ERROR\nSignal: {signal_name} (return code: {run_result.returncode})"
-            if signal_name == "SIGFPE":
-                msg_error += "\nDivision by zero or floating point error."
-            elif signal_name == "SIGSEGV":
-                msg_error += "\nSegmentation fault."
-            elif signal_name == "SIGABRT":
-                msg_error += "\nProgram aborted."
-            elif signal_name == "SIGILL":
-                msg_error += "\nIllegal instruction (SIGILL)."
-            elif signal_name == "SIGBUS":
-                msg_error += "\nBus error."
-            raise CodeException(msg_error)
+    def run_code(self, file_path: str, isProfessorCode: bool, usage: dict = None):
+        objectFiles = self.__professor_object_files() if not isProfessorCode else []
+        exec_file_path = compile_code(file_path, self.__offsetCodeLines, self.__baseCodeLines, objectFiles, self.timings)
+        run_result = run_subprocess("c_binary", [exec_file_path], self.timeLimit, self.timings, usage, self.__execution_limits())
+        check_run_result(run_result, self.__offsetCodeLines)
         outputs = run_result.stdout.split("\n")
         if isProfessorCode:
             return outputs[0]
         outputs[0] = False if outputs[0].upper() == "0" else True
         return outputs
     
+    def run_batch_code(self, file_path: str, numTestCases: int, usages: list = None):
+        #Compila uma única vez e executa cada caso de teste em um processo próprio (crashes e sinais continuam isolados)
+        #usages, se informado, recebe o uso de recursos de cada caso, na mesma ordem dos resultados
+        exec_file_path = compile_code(file_path, self.__offsetCodeLines, self.__baseCodeLines, self.__professor_object_files(), self.timings)
+        limits = self.__execution_limits()
+        outcomes = []
+        for index in range(numTestCases):
+            usage = {} if usages is not None else None
+            if usages is not None:
+                usages.append(usage)
+            try:
+                run_result = run_subprocess("c_binary", [exec_file_path, str(index)], self.timeLimit, self.timings, usage, limits)
+                check_run_result(run_result, self.__offsetCodeLines)
+                outputs = run_result.stdout.split("\n")
+                outputs[0] = False if outputs[0].upper() == "0" else True
+                outcomes.append((outputs, None))
+                continue
+            except (CodeException, subprocess.TimeoutExpired) as e:
+                codeOutput = e
+            
+            profOutput = None
+            if not self.__cachedProfessorOutputs[index]:   #Saídas do professor que já estão em cache não precisam de outra execução
+                try:
+                    prof_result = run_subprocess("c_binary", [exec_file_path, str(index), "prof"], self.timeLimit, self.timings, limits=limits)
+                    check_run_result(prof_result, self.__offsetCodeLines)
+                    profOutput = prof_result.stdout.split("\n")[0]
+                except Exception:
+                    profOutput = None
+            outcomes.append((codeOutput, profOutput))
+            if isinstance(codeOutput, subprocess.TimeoutExpired):
+                break
+        return outcomes
+    
     def run_pre_process_code(self, file_path: str):   #Verificando erros de sintaxe
-        compile_code(file_path, 3, self.__baseCodeLines)
+        compile_code(file_path, 3, self.__baseCodeLines, timings=self.timings)
     
     def pre_process_code(self, code: str, code_path: str):
-        code_without_comments = re.sub(r'(?<!["])\/\/.*$', '', code, flags=re.MULTILINE)
-        code_without_comments = re.sub(r'\/\*[\s\S]*?\*\/', '', code_without_comments, flags=re.MULTILINE)
-        code_without_comments = code_without_comments.strip()
-        print_regex = re.compile(r'\b(printf|puts)\s*\(.*\)')
-        has_print = bool(print_regex.search(code_without_comments))
-        if has_print:
-            raise PrintException("")
-        verify_against_blacklist(code_without_comments)
+        code_without_comments = remove_comments(code)
+        PRE_PROCESS_SCANNER.check(code_without_comments)   #Prints e blacklist em uma única varredura
+        self.__studentCode = code_without_comments
         self.__baseCodeLines = len(code.splitlines())
         
         importPart = "#include <stdio.h>\n#include <string.h>\n#include <stdlib.h>\n"
@@ -111,6 +190,26 @@ int main(){{
             file.write(codeWithMain)
         self.run_pre_process_code(code_path)   #Checando por erros na compilação do código
         return code
+    
+    def __professor_line(self, name_file_professor: str):   #Linha que torna a função do professor visível para o código do aluno (sempre uma única linha, por causa do offset)
+        if self.__professorPrototype is not None:
+            return self.__professorPrototype
+        return f'#include "{name_file_professor}{self.langExtension}"'
+    
+    def __execution_limits(self):   #O AddressSanitizer reserva terabytes de memória virtual e não roda com RLIMIT_AS
+        return execution_limits(self.timeLimit, limitMemory=not address_sanitizer_enabled())
+    
+    def __professor_object(self):   #Caminho do objeto do professor no cache (compila se ainda não existir ou se foi removido)
+        baseProfCode, prototype, funcNameProf = self.__professorCode
+        return artifact_cache.get_or_build(self.__professorObjectKey, ".o", lambda path: compile_professor_object(baseProfCode, prototype, funcNameProf, path, self.timings))
+    
+    def __professor_object_files(self):
+        if self.__professorPrototype is None:
+            return []
+        objectPath = self.__professor_object()   #Também atualiza o uso do objeto, para que ele não seja removido enquanto a submissão roda
+        if objectPath is None:
+            raise InfrastructureException("Couldn't load the compiled solution code.")   #Falha do cache de artefatos, não do código do aluno
+        return [objectPath]
 
 formats_printf = {
     "int": "%d",
@@ -146,22 +245,126 @@ def extract_args(args):
         return args_formatted
 
 
-def compile_code(file_path: str, offSetLines: int, baseCodeLines: int):
+def comparison_line(funcName: str, funcNameProf: str, argsTxt: str, printf_returnType: str):
+    line_comparison = f'printf("%d\\n", {funcName}({argsTxt}) == {funcNameProf}({argsTxt}));'
+    
+    if printf_returnType == "%f" or printf_returnType == "%lf":    #Se o retorno for do tipo float ou double, a comparação será feita com uma tolerância
+        tolerancia = '0.0001'    #Tolerância
+        line_comparison = f'printf("%d\\n", fabs({funcName}({argsTxt}) - {funcNameProf}({argsTxt})) < {tolerancia});'
+        
+    if printf_returnType == "%s":  #Se o retorno for uma string, a comparação será feita com a função strcmp
+        line_comparison = f'printf("%d\\n", strcmp({funcName}({argsTxt}), {funcNameProf}({argsTxt})) == 0);'
+    return line_comparison
+
+def check_run_result(run_result: subprocess.CompletedProcess, offSetLines: int):   #Gera CodeException com a mensagem de erro de execução, se houver
+    if ASAN_OUT_OF_MEMORY_REGEX.search(run_result.stderr):
+        raise MemoryLimitException("RUNTIME ERROR\nAddressSanitizer: out of memory.")
+    if run_result.stderr != "":
+        error_msg = process_runtime_errors(run_result.stderr, offSetLines)
+        if error_msg == "":
+            error_msg = run_result.stderr
+        raise CodeException(error_msg)
+    if run_result.returncode != 0:
+        signal_number = -run_result.returncode
+        signal_name = signal.Signals(signal_number).name
+        msg_error = ""
+        msg_error += f"RUNTIME ERROR\nSignal: {signal_name} (return code: {run_result.returncode})"
+        if signal_name == "SIGFPE":
+            msg_error += "\nDivision by zero or floating point error."
+        elif signal_name == "SIGSEGV":
+            msg_error += "\nSegmentation fault."
+        elif signal_name == "SIGABRT":
+            msg_error += "\nProgram aborted."
+        elif signal_name == "SIGILL":
+            msg_error += "\nIllegal instruction (SIGILL)."
+        elif signal_name == "SIGBUS":
+            msg_error += "\nBus error."
+        raise CodeException(msg_error)
+
+ASAN_OUT_OF_MEMORY_REGEX = re.compile(r'AddressSanitizer: (out of memory|out-of-memory|allocation-size-too-big|requested allocation size)')
+
+def address_sanitizer_enabled():   #Se não estiver rodando no container local ou se estiver no GCR, habilita o address sanitizer (por algum motivo o sanitizer piora muito a performance no container local)
+    return not is_running_in_container() or bool(os.getenv('GCR_INSTANCE'))
+
+def compile_flags():
+    #compile_result = subprocess.run(['gcc', '-O1', '-Wuninitialized', '-Werror', '-o', exec_file_path, file_path, '-lm'], capture_output=True, text=True, timeout=10)  #Importando a biblioteca math.h
+    flags = ['-O1', '-Wuninitialized', '-Werror', '-Wall']
+    if address_sanitizer_enabled():
+        flags += ['-g', '-fsanitize=address']
+    return flags
+
+def compile_code(file_path: str, offSetLines: int, baseCodeLines: int, objectFiles: list = [], timings = None):
     file_name_with_extension = os.path.basename(file_path)  #Nome do arquivo (com extensão)
     file_name = os.path.splitext(file_name_with_extension)[0]
     exec_file_path = file_path.replace(file_name_with_extension, file_name)
-    #compile_result = subprocess.run(['gcc', '-O1', '-Wuninitialized', '-Werror', '-o', exec_file_path, file_path, '-lm'], capture_output=True, text=True, timeout=10)  #Importando a biblioteca math.h
-    #compile_result = subprocess.run(['gcc', '-O1', '-Wuninitialized', '-Werror', '-Wall', '-g', '-fsanitize=address', '-o', exec_file_path, file_path, '-lm'], capture_output=True, text=True, timeout=10)  #Importando a biblioteca math.h
-    list_compile = ['gcc', '-O1', '-Wuninitialized', '-Werror', '-Wall', '-o', exec_file_path, file_path, '-lm']
-    if not is_running_in_container() or os.getenv('GCR_INSTANCE'):  #Se não estiver rodando no container local ou se estiver no GCR, habilita o address sanitizer (por algum motivo o sanitizer piora muito a performance no container local)
-        list_compile = ['gcc', '-O1', '-Wuninitialized', '-Werror', '-Wall', '-g', '-fsanitize=address', '-o', exec_file_path, file_path, '-lm']
-    compile_result = subprocess.run(list_compile, capture_output=True, text=True, timeout=10)
+    list_compile = ['gcc', *compile_flags(), '-o', exec_file_path, file_path, *objectFiles, '-lm']
+    with observe_stage("c", "compile", timings):
+        compile_result = run_subprocess("gcc", list_compile, TIME_LIMIT, timings)
     if compile_result.stderr != "":
         error_message = process_compile_errors(compile_result.stderr, offSetLines, baseCodeLines)
         raise CodeException(error_message)
     
     return exec_file_path
 
+PROFESSOR_PRELUDE = "#include <stdio.h>\n#include <string.h>\n#include <stdlib.h>\n#include <math.h>\n"   #Mesmos includes que o código do professor enxergava dentro do código do aluno
+
+def professor_prototype(baseProfCode: str, funcNameProf: str):   #Declaração (em uma linha) da função do professor, ou None se não der para extraí-la
+    code = remove_comments(baseProfCode)
+    definition = re.search(r'\b' + re.escape(funcNameProf) + r'\s*\(([^()]*)\)\s*\{', code)
+    if not definition:
+        return None
+    prefix = re.split(r'[;}]', code[:definition.start()])[-1]
+    prefix = "\n".join(line for line in prefix.splitlines() if not line.strip().startswith("#"))   #Ignora diretivas do pré-processador antes da definição
+    returnType = " ".join(prefix.split())
+    if returnType == "" or re.search(r'\b(static|inline)\b', returnType):
+        return None
+    params = " ".join(definition.group(1).split())
+    return f"{returnType} {funcNameProf}({params});"
+
+PRELUDE_DIRECTIVE_REGEX = re.compile(r'^\s*#\s*include\s*<(stdio|string|stdlib|math)\.h>\s*$')
+SHARED_DECLARATION_REGEX = re.compile(r'\b(typedef|struct|union|enum)\b')
+IDENTIFIER_REGEX = re.compile(r'\b[A-Za-z_]\w*\b')
+
+def object_preserves_include(baseProfCode: str):
+    #Com o #include, os cabeçalhos, macros e tipos do professor também ficavam visíveis para o código do aluno. O objeto só é usado quando o professor
+    #não tem nada disso além do PROFESSOR_PRELUDE, para não mudar o resultado da compilação do aluno
+    code = remove_comments(baseProfCode)
+    for line in code.splitlines():
+        if line.strip().startswith("#") and not PRELUDE_DIRECTIVE_REGEX.match(line):
+            return False
+    return not SHARED_DECLARATION_REGEX.search(code)
+
+_professor_symbols = {}   #caminho do objeto -> nomes definidos nele
+
+def professor_symbols(object_path: str):   #Funções e variáveis globais definidas no objeto do professor (inclusive as locais depois do objcopy)
+    symbols = _professor_symbols.get(object_path)
+    if symbols is None:
+        nm_result = run_subprocess("nm", ['nm', '--defined-only', object_path], TIME_LIMIT)
+        if nm_result.returncode != 0:
+            raise InfrastructureException(f"Couldn't list the symbols of the compiled solution code: {nm_result.stderr}")
+        symbols = {line.split()[-1] for line in nm_result.stdout.splitlines() if line.strip()}
+        symbols = {symbol for symbol in symbols if IDENTIFIER_REGEX.fullmatch(symbol)}
+        _professor_symbols[object_path] = symbols
+    return symbols
+
+def compile_professor_object(baseProfCode: str, prototype: str, funcNameProf: str, object_path: str, timings = None):
+    #A declaração vem antes do código: se ela depender de tipos do professor ou não bater com a definição, a compilação falha e o #include continua sendo usado
+    source_path = object_path + ".c"
+    try:
+        with open(source_path, 'w') as file:
+            file.write(f"{PROFESSOR_PRELUDE}{prototype}\n{baseProfCode}\n")
+        with observe_stage("c", "compile_professor_object", timings):
+            compile_result = run_subprocess("gcc", ['gcc', *compile_flags(), '-c', '-o', object_path, source_path], TIME_LIMIT, timings)
+        if compile_result.returncode != 0 or compile_result.stderr != "":
+            raise CodeException(compile_result.stderr)
+        #Apenas a função avaliada fica global: funções auxiliares do professor não conflitam com as do aluno na ligação
+        localize_result = run_subprocess("objcopy", ['objcopy', f'--keep-global-symbol={funcNameProf}', object_path], TIME_LIMIT, timings)
+        if localize_result.returncode != 0:
+            raise CodeException(localize_result.stderr)
+    finally:
+        if os.path.exists(source_path):
+            os.remove(source_path)
+
 def process_compile_errors(compile_error: str, offSetLines: int, baseCodeLines: int):
     compile_error_pattern = re.compile(r'([^:]+):(\d+):(\d+): (\w+): (.+)')   #Uso de expressões regulares
     function_error = ""
@@ -219,34 +422,35 @@ def process_runtime_errors(runtime_error: str, offSetLines: int):
     return ""
     
 
-def verify_against_blacklist(code):
-    memory_leak_patterns = [  #Verificando uso de funções de alocação de memória
-        r'\bmalloc\b', r'\bcalloc\b', r'\brealloc\b', r'\bfree\b'
-    ]
-    file_operations_patterns = [  #Verificando uso de funções de manipulação de arquivos
-        r'\bfopen\b', r'\bfclose\b', r'\bfread\b', r'\bfwrite\b',
-        r'\bfprintf\b', r'\bfscanf\b', r'\bfgets\b', r'\bfputs\b'
-    ]
-    
-    memory_leak_found = any(re.search(pattern, code) for pattern in memory_leak_patterns)
-    if memory_leak_found:
-        raise DangerException("Dynamic memory allocation functions are not allowed.")
-    file_operations_found = any(re.search(pattern, code) for pattern in file_operations_patterns)
-    if file_operations_found:
-        raise DangerException("File operations functions are not allowed.")
-    
-    dangerous_patterns = [
-        r"#include\s*<unistd.h>",     # chamadas do sistema
-        r"#include\s*<sys/.*>",       # manipulação de kernel
-        r"\bsystem\b\s*\(",               # comandos no shell
-        r"\bpopen\b\s*\(",                # executa processos
-        r"\bfork\b\s*\(",                 # cria novos processos
-        r"\bexec[lv][ep]?\b\s*\(",        # executa binários (execl, execv, execlp, execvp)
-        r"#\s*define"                     # prevenção contra macros
-    ]
-
-    for pattern in dangerous_patterns:
-        if re.search(pattern, code):
-            raise DangerException("Potentially dangerous code found.")
-    
-    return
\ No newline at end of file
+LINE_COMMENT_REGEX = re.compile(r'(?<!["])\/\/.*$', flags=re.MULTILINE)
+BLOCK_COMMENT_REGEX = re.compile(r'\/\*[\s\S]*?\*\/', flags=re.MULTILINE)
+
+def remove_comments(code: str):
+    code_without_comments = LINE_COMMENT_REGEX.sub('', code)
+    code_without_comments = BLOCK_COMMENT_REGEX.sub('', code_without_comments)
+    return code_without_comments.strip()
+
+memory_leak_patterns = [  #Verificando uso de funções de alocação de memória
+    r'\bmalloc\b', r'\bcalloc\b', r'\brealloc\b', r'\bfree\b'
+]
+file_operations_patterns = [  #Verificando uso de funções de manipulação de arquivos
+    r'\bfopen\b', r'\bfclose\b', r'\bfread\b', r'\bfwrite\b',
+    r'\bfprintf\b', r'\bfscanf\b', r'\bfgets\b', r'\bfputs\b'
+]
+dangerous_patterns = [
+    r"#include\s*<unistd.h>",     # chamadas do sistema
+    r"#include\s*<sys/.*>",       # manipulação de kernel
+    r"\bsystem\b\s*\(",               # comandos no shell
+    r"\bpopen\b\s*\(",                # executa processos
+    r"\bfork\b\s*\(",                 # cria novos processos
+    r"\bexec[lv][ep]?\b\s*\(",        # executa binários (execl, execv, execlp, execvp)
+    r"#\s*define"                     # prevenção contra macros
+]
+
+#Regras em ordem de prioridade: a mensagem é a mesma das verificações feitas uma a uma
+PRE_PROCESS_SCANNER = RuleScanner(
+    [(r'\b(printf|puts)\s*\(.*\)', PrintException, "")]
+    + [(pattern, DangerException, "Dynamic memory allocation functions are not allowed.") for pattern in memory_leak_patterns]
+    + [(pattern, DangerException, "File operations functions are not allowed.") for pattern in file_operations_patterns]
+    + [(pattern, DangerException, "Potentially dangerous code found.") for pattern in dangerous_patterns]
+)
@@ -0,0 +1,24 @@
+import re
+
+class RuleScanner():   #Conjunto de regras de uma linguagem compilado uma única vez em uma só expressão regular
+    def __init__(self, rules: list):   #rules: [(padrão, classe da exceção, mensagem)], em ordem de prioridade
+        self.rules = rules
+        alternatives = "|".join(f"(?P<rule{index}>{pattern})" for index, (pattern, _, _) in enumerate(rules))
+        #O lookahead não consome o texto: em cada posição todas as regras são testadas, então uma regra nunca é escondida por outra que casou antes
+        self.__regex = re.compile(f"(?=(?:{alternatives}))")
+
+    def first_match(self, code: str):   #Índice da regra de maior prioridade que aparece no código, ou None
+        best = None
+        for match in self.__regex.finditer(code):   #Uma única varredura do código
+            index = int(match.lastgroup[len("rule"):])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return best
+
+    def check(self, code: str):   #Gera a exceção da regra de maior prioridade encontrada
+        index = self.first_match(code)
+        if index is not None:
+            _, exceptionClass, message = self.rules[index]
+            raise exceptionClass(message)
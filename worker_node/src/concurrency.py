@@ -0,0 +1,57 @@
+from pathlib import Path
+from utils import get_env_int
+import logging
+import math
+import os
+import threading
+
+CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_CPU_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+CGROUP_V1_CPU_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+
+def cgroup_cpu_limit():   #Limite de CPU do container em núcleos (cgroup v2 ou v1), ou None se não houver limite
+    try:
+        quota, period = CGROUP_V2_CPU_MAX.read_text().split()[:2]   #"max 100000" ou "200000 100000"
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(CGROUP_V1_CPU_QUOTA.read_text())   #-1 sem limite
+        period = int(CGROUP_V1_CPU_PERIOD.read_text())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def available_cpus():   #Núcleos que o processo pode usar: os da máscara de afinidade, limitados pela cota do cgroup (requests/limits do Kubernetes)
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        return max(1.0, min(cpus, limit))
+    return cpus
+
+def evaluation_slots():   #Avaliações simultâneas por processo: EVALUATION_SLOTS, ou os núcleos divididos entre os processos do gunicorn
+    configured = get_env_int("EVALUATION_SLOTS", 0)
+    if configured > 0:
+        return configured
+    processes = max(1, get_env_int("EVALUATION_PROCESSES", 1))   #Definida pelo gunicorn.conf.py no modo gthread
+    return max(1, math.ceil(available_cpus() / processes))
+
+
+_evaluation_semaphore = None
+_evaluation_semaphore_lock = threading.Lock()
+
+def get_evaluation_semaphore():   #Um semáforo por processo do gunicorn, criado no primeiro uso. Vale para todos os endpoints que avaliam submissões
+    global _evaluation_semaphore
+    with _evaluation_semaphore_lock:
+        if _evaluation_semaphore is None:
+            slots = evaluation_slots()
+            logging.info(f"Evaluation slots in process {os.getpid()}: {slots} (available CPUs: {available_cpus()})")
+            _evaluation_semaphore = threading.BoundedSemaphore(slots)
+        return _evaluation_semaphore
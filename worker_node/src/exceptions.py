@@ -24,4 +24,25 @@ class CodeException(Exception):
         self.message = message
 
     def __str__(self):
-        return self.message
\ No newline at end of file
+        return self.message
+
+class MemoryLimitException(CodeException):   #O código excedeu o limite de memória (veredito próprio, separado de erro de execução e TLE)
+    def __init__(self, message):
+        super().__init__(message)
+
+class KernelKillException(MemoryLimitException):   #O processo foi morto pelo kernel (SIGKILL) sem estourar o tempo de CPU. Pode ter sido a falta de memória do container, e não o código, então o veredito não vai para o cache de resultados
+    def __init__(self, message):
+        super().__init__(message)
+
+class WorkerException(Exception):   #Falha de um processo auxiliar (ex.: worker do pool de Julia), não do código enviado
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+class InfrastructureException(Exception):   #Falha do ambiente depois que o código enviado já começou a rodar (ex.: o zygote morreu). Vira um erro do servidor, sem executar o código de novo
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
@@ -0,0 +1,27 @@
+#Configuração lida automaticamente pelo gunicorn (./gunicorn.conf.py no diretório de trabalho). As opções de linha de comando continuam no CMD do Dockerfile e têm prioridade sobre as daqui
+import os
+import shutil
+from prometheus_client import multiprocess
+
+#SERVER_MODE=sync (padrão): um processo por requisição, bloqueado enquanto a submissão roda.
+#SERVER_MODE=gthread: poucos processos com muitas threads. As avaliações simultâneas são limitadas pelas vagas de cada processo (concurrency.py), calculadas a partir dos núcleos disponíveis
+SERVER_MODE = os.getenv("SERVER_MODE", "sync")
+if SERVER_MODE == "gthread":
+    worker_class = "gthread"
+    workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+    threads = int(os.getenv("GUNICORN_THREADS", "64"))   #Conexões atendidas por processo: as que passam das vagas esperam na fila (etapa "queue")
+    os.environ.setdefault("EVALUATION_PROCESSES", str(workers))   #Os núcleos são divididos entre os processos
+elif SERVER_MODE == "sync":
+    workers = int(os.getenv("GUNICORN_WORKERS", "11"))
+else:
+    raise ValueError(f"Invalid SERVER_MODE: {SERVER_MODE}")
+
+def on_starting(server):   #Apaga as métricas deixadas por uma execução anterior
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):   #Os gauges do processo que terminou deixam de entrar na soma
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,76 @@
+from utils import get_env_int, process_exists
+import os
+import re
+import json
+import time
+import uuid
+import tempfile
+import logging
+
+JOB_ID_REGEX = re.compile(r'^[0-9a-f]{32}$')
+FINISHED_STATUSES = {"done", "failed"}
+
+class JobStore():   #Estado dos jobs assíncronos em um diretório compartilhado pelos processos do gunicorn (o GET pode chegar em outro processo)
+    def __init__(self, directory: str, ttl: int):
+        self.directory = directory
+        self.ttl = ttl
+
+    def create(self):
+        os.makedirs(self.directory, exist_ok=True)
+        jobId = uuid.uuid4().hex
+        self.update(jobId, {'status': 'queued', 'pid': os.getpid(), 'created_at': time.time()})
+        return jobId
+
+    def update(self, jobId: str, job: dict):   #Escrita atômica: quem consulta nunca lê um arquivo pela metade
+        fd, tmpPath = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as file:
+            json.dump(job, file)
+        os.replace(tmpPath, self.__path(jobId))
+
+    def get(self, jobId: str):   #Retorna o job ou None se ele não existir (ou já tiver expirado)
+        if not JOB_ID_REGEX.match(jobId):
+            return None
+        try:
+            with open(self.__path(jobId)) as file:
+                job = json.load(file)
+                updatedAt = os.fstat(file.fileno()).st_mtime   #A última escrita do job (o fim, para os jobs terminados)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if job['status'] not in FINISHED_STATUSES and not process_exists(job['pid']):   #O processo que executava o job morreu
+            job = {**job, 'status': 'failed', 'status_code': 500, 'result': {'errorMsg': "Error: The worker running this job stopped."}}
+        if job['status'] in FINISHED_STATUSES and updatedAt < time.time() - self.ttl:   #Expirou: o sweep só roda quando chegam jobs novos
+            self.__remove(jobId)
+            return None
+        return job
+
+    def sweep(self):   #Remove os jobs terminados há mais tempo que o TTL
+        if not os.path.isdir(self.directory):
+            return
+        limit = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime >= limit:
+                    continue
+                if not entry.name.startswith(".tmp-"):
+                    job = self.get(entry.name[:-len(".json")])
+                    if job is not None and job['status'] not in FINISHED_STATUSES:
+                        continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.warning(f"Couldn't remove expired job {entry.path}: {e}")
+
+    def __remove(self, jobId: str):
+        try:
+            os.remove(self.__path(jobId))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Couldn't remove expired job {jobId}: {e}")
+
+    def __path(self, jobId: str):
+        return os.path.join(self.directory, jobId + ".json")
+
+
+job_store = JobStore(os.getenv("JOB_DIR", os.path.join(tempfile.gettempdir(), "worker-jobs")), get_env_int("JOB_RESULT_TTL", 600))
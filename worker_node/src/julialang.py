@@ -1,16 +1,25 @@
 from baselanguage import BaseLanguage
-from exceptions import CodeException, PrintException, ImportException
-import subprocess
+from exceptions import CodeException, PrintException, ImportException, WorkerException, MemoryLimitException
+from juliapool import get_julia_pool
+from codescanner import RuleScanner
+from timings import run_subprocess
+from resourcelimits import execution_limits, memory_limit_mb
+from utils import get_env_flag, get_env_int
+import logging
 import os
 import re
 
+TIME_LIMIT = 20   #Tempo limite (em segundos) para a execução de cada caso de teste
+
 class JuliaLanguage(BaseLanguage):
     def __init__(self, langExtension:str): 
         self.__offsetCodeLines = 1
         self.__baseCodeLines = -1
         super().__init__(langExtension)
+        self.parallelWorkers = get_env_int("JULIA_PARALLEL_WORKERS", 1)   #Cada caso em Julia usa bem mais memória
+        self.timeLimit = self.defaultTimeLimit = TIME_LIMIT
     
-    def base_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, arg, returnType = ""):
+    def base_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, arg, returnType = "", expectedOutput = None):
         #print(f"baseCodeLines: {self.__baseCodeLines}")
         self.__baseCodeLines = len(baseCode.splitlines())
         importProfLine = f'include("{name_file_professor}.jl")\n'
@@ -30,83 +39,47 @@ class JuliaLanguage(BaseLanguage):
         return
     
 
-    def run_code(self, file_path: str, isProfessorCode: bool):
-        result = subprocess.run(["julia", file_path], capture_output=True, text=True, timeout=20)
-        #result = subprocess.run(["julia", "-e", "using DaemonMode; runargs()", os.path.abspath(file_path)], capture_output=True, text=True, check=True, cwd=os.path.dirname(file_path), timeout=20)
-        if result.stderr != "":
-            error_message = process_errors(result.stderr, self.__offsetCodeLines, self.__baseCodeLines, file_path)
-            raise CodeException(error_message)
-        outputs = result.stdout.split("\n")
-        if isProfessorCode:
-            return outputs[0]
-        outputs[0] = True if outputs[0].upper() == "TRUE" else False
-        return outputs
-
-        
-        #Usando o Daemon Mode:
-        #result = subprocess.run(["julia", "-e", "using DaemonMode; runargs()", file_path], capture_output=True, text=True, cwd=os.path.dirname(file_path), timeout=20)
-        #if "error" in result.stdout.lower():
-        #    error_message = process_errors(result.stdout, self.__offsetCodeLines, self.__baseCodeLines, file_path)
-        #    raise CodeException(error_message)
-        #outputs = result.stdout.split("\n")
-        #if isProfessorCode:
-        #    return outputs[0]
-        #outputs[0] = True if outputs[0].upper() == "TRUE" else False
-        #return outputs
-
-    """
-    def run_code(self, file_path: str, isProfessorCode: bool, juliaREPLSession, isFirst: bool, isLast: bool):   #Testando o REPL   
-        juliaREPLSession.stdin.write(f'include("{file_path}")' + "\n")  # Envia o comando
-        juliaREPLSession.stdin.flush()
-        
-        # Captura a saída normal (stdout) e erros (stderr)
-        output = ""
-        errors = ""
-        while True:
-            # Leia stdout
-            line = juliaREPLSession.stdout.readline()
-            if line.strip() == "":  # Fim da saída padrão
-                break
-            output += line.strip()
-
-        while True:
-            # Leia stderr
-            error_line = juliaREPLSession.stderr.readline()
-            if error_line.strip() == "":  # Fim dos erros
-                break
-            errors += error_line.strip()
-    
-        if errors != "":
-            error_message = process_errors(errors, self.__offsetCodeLines, self.__baseCodeLines, file_path)
+    def run_code(self, file_path: str, isProfessorCode: bool, usage: dict = None):
+        stdout, stderr = execute_file(file_path, self.timeLimit, self.timings, usage)
+        if stderr != "":
+            error_message = process_errors(stderr, self.__offsetCodeLines, self.__baseCodeLines, file_path)
+            if "OutOfMemoryError" in stderr:
+                raise MemoryLimitException(error_message)
             raise CodeException(error_message)
-        outputs = output.split("\n")
+        outputs = stdout.split("\n")
         if isProfessorCode:
             return outputs[0]
         outputs[0] = True if outputs[0].upper() == "TRUE" else False
         return outputs
-    """
 
     def run_pre_process_code(self, file_path: str):
-        result = subprocess.run(["julia", file_path], capture_output=True, text=True, timeout=20)
-        stderr = result.stderr
+        stdout, stderr = execute_file(file_path, TIME_LIMIT, self.timings)
         if stderr != "":
             error_message = process_errors(stderr, 0, self.__baseCodeLines, file_path)
             raise CodeException(error_message)
     
     def pre_process_code(self, code: str, code_path: str):
-        code_without_comments = re.sub(r'#=(.*?)=#', '', code, flags=re.DOTALL)
-        code_without_comments = re.sub(r'(?<!["\'])#.*$', '', code_without_comments, flags=re.MULTILINE)
+        code_without_comments = BLOCK_COMMENT_REGEX.sub('', code)
+        code_without_comments = LINE_COMMENT_REGEX.sub('', code_without_comments)
         code_without_comments = code_without_comments.strip()
-        print_regex = re.compile(r'\b(print|println)\s*\(.*\)|@\b(printf|show)\b')
-        has_print = bool(print_regex.search(code_without_comments))
-        if has_print:
-            raise PrintException("")
-        verify_against_blacklist(code_without_comments)   #Verificando importações inválidas
+        PRE_PROCESS_SCANNER.check(code_without_comments)   #Prints e importações inválidas em uma única varredura
         self.__baseCodeLines = len(code.splitlines())
         self.run_pre_process_code(code_path)
         return code
     
     
+def execute_file(file_path: str, timeout: float, timings = None, usage: dict = None):   #Retorna (stdout, stderr) da execução do arquivo, usando o pool de workers aquecidos se JULIA_POOL=True
+    if get_env_flag("JULIA_POOL"):
+        try:
+            return get_julia_pool().run_file(file_path, timeout, timings, usage)   #Os workers do pool são compartilhados e rodam sem rlimits: a memória é vigiada pelo próprio pool
+        except WorkerException as e:
+            logging.warning(f"Julia pool unavailable, running a new process: {e}")
+    limits = execution_limits(timeout, limitMemory=False)   #O runtime do Julia reserva muita memória virtual ao iniciar e não sobe com RLIMIT_AS
+    memoryLimitMb = memory_limit_mb()   #No lugar do RLIMIT_AS, como nos workers do pool: o GC recebe o limite e o processo é morto se o RSS passar dele
+    heapOptions = [f"--heap-size-hint={memoryLimitMb}M"] if memoryLimitMb > 0 else []
+    result = run_subprocess("julia", ["julia", *heapOptions, file_path], timeout, timings, usage, limits, memoryLimitMb)
+    return result.stdout, result.stderr
+    
 def process_errors(stderr: str, offSetLines: int, baseCodeLines: int, file_path: str):
     path = os.path.normpath(file_path)
     result_path = os.sep.join(path.split(os.sep)[-3:])  #Pegando os 3 últimos diretórios do caminho relativo do arquivo
@@ -163,7 +136,7 @@ def process_errors(stderr: str, offSetLines: int, baseCodeLines: int, file_path:
             error_message += f" - {extracted}"
     
     #Procurando a linha:
-    stacktrace_pattern = re.compile(r'run_me.jl:(\d+)')
+    stacktrace_pattern = re.compile(r'(?<![\w])' + re.escape(os.path.basename(path)) + r':(\d+)')   #Os arquivos podem ter sufixo do caso de teste (run_me_3.jl) no modo paralelo
     stacktrace_matches = stacktrace_pattern.findall(stderr)
     if stacktrace_matches:
         for line in stacktrace_matches:
@@ -182,29 +155,32 @@ def convert_single_to_double_quotes(arg_string):
     arg_string = re.sub(r'^"|"$', "'", arg_string)    #Substitui as aspas duplas externas por aspas simples
     return arg_string
 
-def verify_against_blacklist(code: str):
-    blacklist = [
-        r'\busing\s+FileIO\b',               # using FileIO
-        r'\busing\s+Sockets\b',              # using Sockets
-        r'\busing\s+Distributed\b',          # using Distributed
-        r'\busing\s+Libc\b',                 # using Libc
-        r'\busing\s+Libdl\b',                # using Libdl (usado para manipulação de bibliotecas externas)
-        r'\busing\s+DelimitedFiles\b',       # using DelimitedFiles (permite leitura e escrita de arquivos)
-        r'\busing\s+Base\b',                 # using Base (excesso de permissões)
-        r'\bimport\s+FileIO\b',              # import FileIO
-        r'\bimport\s+Sockets\b',             # import Sockets
-        r'\bimport\s+Distributed\b',         # import Distributed
-        r'\bimport\s+Libc\b',                # import Libc
-        r'\bimport\s+Libdl\b',               # import Libdl
-        r'\bimport\s+Base\b',                # import Base (excesso de permissões)
-        r'\bopen\s*\(',                      # open(...)
-        r'\brun\s*\(',                       # run(...)
-        r'\beval\s*\(',                      # eval(...)
-        r'\bsystem\s*\(',                    # system(...) - execução de comandos do sistema
-        r'\bread\s*\(',                      # read(...) - leitura de arquivos
-        r'\bwrite\s*\(',                     # write(...) - escrita de arquivos
-    ]
+BLOCK_COMMENT_REGEX = re.compile(r'#=(.*?)=#', flags=re.DOTALL)
+LINE_COMMENT_REGEX = re.compile(r'(?<!["\'])#.*$', flags=re.MULTILINE)
+
+blacklist = [
+    r'\busing\s+FileIO\b',               # using FileIO
+    r'\busing\s+Sockets\b',              # using Sockets
+    r'\busing\s+Distributed\b',          # using Distributed
+    r'\busing\s+Libc\b',                 # using Libc
+    r'\busing\s+Libdl\b',                # using Libdl (usado para manipulação de bibliotecas externas)
+    r'\busing\s+DelimitedFiles\b',       # using DelimitedFiles (permite leitura e escrita de arquivos)
+    r'\busing\s+Base\b',                 # using Base (excesso de permissões)
+    r'\bimport\s+FileIO\b',              # import FileIO
+    r'\bimport\s+Sockets\b',             # import Sockets
+    r'\bimport\s+Distributed\b',         # import Distributed
+    r'\bimport\s+Libc\b',                # import Libc
+    r'\bimport\s+Libdl\b',               # import Libdl
+    r'\bimport\s+Base\b',                # import Base (excesso de permissões)
+    r'\bopen\s*\(',                      # open(...)
+    r'\brun\s*\(',                       # run(...)
+    r'\beval\s*\(',                      # eval(...)
+    r'\bsystem\s*\(',                    # system(...) - execução de comandos do sistema
+    r'\bread\s*\(',                      # read(...) - leitura de arquivos
+    r'\bwrite\s*\(',                     # write(...) - escrita de arquivos
+]
 
-    for pattern in blacklist:
-        if re.search(pattern, code):
-            raise ImportException("Not allowed import or method found.")
\ No newline at end of file
+PRE_PROCESS_SCANNER = RuleScanner(
+    [(r'\b(print|println)\s*\(.*\)|@\b(printf|show)\b', PrintException, "")]
+    + [(pattern, ImportException, "Not allowed import or method found.") for pattern in blacklist]
+)
@@ -0,0 +1,225 @@
+from exceptions import WorkerException, CodeException, MemoryLimitException, KernelKillException, InfrastructureException
+from pathlib import Path
+from utils import get_env_int
+from metrics import SUBPROCESS_SPAWNS
+from resourcelimits import memory_limit_mb, resource_usage, rss_kb
+import os
+import signal
+import subprocess
+import selectors
+import threading
+import logging
+import atexit
+import time
+import uuid
+
+WORKER_SCRIPT = (Path(__file__).parent / "juliaworker.jl").absolute()
+STARTUP_TIMEOUT = 120   #O primeiro start do Julia (com a compilação do aquecimento) pode ser lento
+WATCHDOG_INTERVAL = 0.1   #Intervalo (em segundos) entre as leituras da memória do worker durante uma execução
+
+class JuliaWorker():   #Processo Julia de longa duração que executa arquivos enviados pelo pipe (protocolo descrito em juliaworker.jl)
+    def __init__(self, memoryLimitMb: int = 0):
+        #O worker roda sem rlimits (o RLIMIT_CPU é acumulado entre os jobs e o runtime não sobe com RLIMIT_AS). Com memoryLimitMb, o GC do Julia
+        #recebe o limite como --heap-size-hint e cada execução é vigiada pelo RSS do worker, que é morto ao ultrapassá-lo
+        self.__mark = uuid.uuid4().hex
+        self.__buffer = b""
+        self.__memoryLimitMb = memoryLimitMb
+        self.__watchMemory = False   #Só durante as execuções, e não no aquecimento
+        self.jobs = 0
+        self.changedState = False   #Um job alterou o estado do processo (métodos fora do módulo da submissão, ENV, diretório atual...): o worker não é reaproveitado
+        self.startedAt = time.monotonic()
+        SUBPROCESS_SPAWNS.labels("julia_worker").inc()
+        heapOptions = [f"--heap-size-hint={memoryLimitMb}M"] if memoryLimitMb > 0 else []
+        self.process = subprocess.Popen(
+            ["julia", "--startup-file=no", "--history-file=no", *heapOptions, str(WORKER_SCRIPT), self.__mark],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.process.stdout, selectors.EVENT_READ)
+        try:
+            header = self.__read_line(time.monotonic() + STARTUP_TIMEOUT)
+        except (subprocess.TimeoutExpired, WorkerException) as e:
+            self.kill()
+            raise WorkerException(f"Julia worker did not start: {e}")
+        if header != f"{self.__mark} READY":
+            self.kill()
+            raise WorkerException(f"Unexpected Julia worker handshake: {header}")
+
+    def run(self, file_path: str, code: str, timeout: float):   #Retorna (stdout, stderr) como o subprocess.run retornaria
+        #Gera WorkerException apenas se o código não chegou ao worker (quem chama pode rodá-lo em outro processo). Depois do envio, o código pode ter rodado:
+        #estourar a memória gera MemoryLimitException, o worker morto pelo kernel gera KernelKillException, o worker encerrado pelo código (ex.: Base.exit)
+        #gera CodeException, como um erro de execução, e uma resposta fora do protocolo gera InfrastructureException
+        deadline = time.monotonic() + timeout
+        codeBytes = code.encode()
+        try:
+            self.process.stdin.write(f"{file_path}\t{len(codeBytes)}\n".encode() + codeBytes)
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerException(f"Julia worker pipe closed: {e}")
+        self.__watchMemory = self.__memoryLimitMb > 0
+        try:
+            header = self.__read_line(deadline).split(" ")
+            if len(header) != 4 or header[0] != self.__mark:
+                raise InfrastructureException(f"Unexpected Julia worker response: {' '.join(header)}")
+            stdout = self.__read_exact(int(header[1]), deadline)
+            stderr = self.__read_exact(int(header[2]), deadline)
+        except WorkerException:   #O worker fechou o stdout no meio da execução
+            try:
+                returncode = self.process.wait(1)
+            except subprocess.TimeoutExpired:
+                returncode = None
+            if returncode == -signal.SIGKILL:
+                raise KernelKillException("julia_worker was killed by the kernel (SIGKILL)")
+            if returncode is not None and returncode < 0:
+                raise CodeException(f"ProcessExited: the Julia process was terminated by {signal.Signals(-returncode).name} while running the code")
+            raise CodeException(f"ProcessExited: the code terminated the Julia process (exit code {returncode})")
+        finally:
+            self.__watchMemory = False
+        self.jobs += 1
+        self.changedState = self.changedState or header[3] == "1"
+        return stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+    def memory_mb(self):
+        return rss_kb(self.process.pid) / 1024
+
+    def is_expired(self, maxJobs: int, maxAge: int, maxMemoryMb: int):
+        if self.process.poll() is not None or self.changedState:
+            return True
+        if self.jobs >= maxJobs or time.monotonic() - self.startedAt >= maxAge:
+            return True
+        return self.memory_mb() >= maxMemoryMb
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait()
+        except OSError:
+            pass
+        self.__selector.close()
+
+    def __read_more(self, deadline: float):
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired("julia", remaining)
+            if not self.__watchMemory:
+                if not self.__selector.select(remaining):
+                    raise subprocess.TimeoutExpired("julia", remaining)
+                break
+            if self.__selector.select(min(remaining, WATCHDOG_INTERVAL)):
+                break
+            if self.memory_mb() > self.__memoryLimitMb:
+                raise MemoryLimitException("Julia worker exceeded the memory limit")
+        chunk = os.read(self.process.stdout.fileno(), 65536)
+        if not chunk:
+            raise WorkerException("Julia worker exited unexpectedly")
+        self.__buffer += chunk
+
+    def __read_line(self, deadline: float):
+        while b"\n" not in self.__buffer:
+            self.__read_more(deadline)
+        line, self.__buffer = self.__buffer.split(b"\n", 1)
+        return line.decode()
+
+    def __read_exact(self, size: int, deadline: float):
+        while len(self.__buffer) < size:
+            self.__read_more(deadline)
+        data, self.__buffer = self.__buffer[:size], self.__buffer[size:]
+        return data
+
+
+class JuliaPool():   #Mantém workers aquecidos e os recicla por número de jobs, idade, memória ou timeout
+    def __init__(self, size: int, maxJobs: int, maxAge: int, maxMemoryMb: int, memoryLimitMb: int = 0):   #memoryLimitMb: limite de memória de cada execução (0 desativa)
+        self.size = size
+        self.maxJobs = maxJobs
+        self.maxAge = maxAge
+        self.maxMemoryMb = maxMemoryMb
+        self.memoryLimitMb = memoryLimitMb
+        self.__idle = []
+        self.__lock = threading.Lock()
+        self.__slots = threading.BoundedSemaphore(size)
+
+    def run_file(self, file_path: str, timeout: float, timings = None, usage: dict = None):   #timings/usage: o worker é compartilhado, então só o tempo de parede é medido
+        start = time.monotonic()
+        with open(file_path, "r") as file:
+            code = file.read()
+        with self.__slots:
+            worker = self.__checkout()
+            try:
+                stdout, stderr = worker.run(os.path.abspath(file_path), code, timeout)
+            except subprocess.TimeoutExpired:   #O único jeito de interromper o código é matando o worker
+                worker.kill()
+                self.__replace()
+                raise subprocess.TimeoutExpired(["julia", file_path], timeout)
+            except WorkerException:
+                worker.kill()
+                raise
+            except (CodeException, InfrastructureException):   #O código pode ter rodado (MemoryLimitException é uma CodeException): o worker é descartado e o erro vai para quem chamou, sem nova execução
+                worker.kill()
+                self.__replace()
+                raise
+            self.__checkin(worker)
+        wallSeconds = time.monotonic() - start
+        if timings is not None:
+            timings.add_subprocess("julia_pool", wallSeconds)
+        if usage is not None:
+            usage.update(resource_usage(wallSeconds, None))
+        return stdout, stderr
+
+    def shutdown(self):
+        with self.__lock:
+            idle, self.__idle = self.__idle, []
+        for worker in idle:
+            worker.kill()
+
+    def __checkout(self):
+        with self.__lock:
+            worker = self.__idle.pop() if self.__idle else None
+        if worker is None:
+            return JuliaWorker(self.memoryLimitMb)
+        return worker
+
+    def __checkin(self, worker: JuliaWorker):
+        if worker.is_expired(self.maxJobs, self.maxAge, self.maxMemoryMb):
+            reason = " (the last job changed the process state)" if worker.changedState else ""
+            logging.info(f"Recycling Julia worker {worker.process.pid} after {worker.jobs} jobs{reason}")
+            worker.kill()
+            self.__replace()
+            return
+        with self.__lock:
+            self.__idle.append(worker)
+
+    def __replace(self):   #Sobe o substituto em background para que a próxima execução já encontre um worker aquecido
+        threading.Thread(target=self.__spawn_idle, daemon=True).start()
+
+    def __spawn_idle(self):
+        try:
+            worker = JuliaWorker(self.memoryLimitMb)
+        except (WorkerException, OSError) as e:
+            logging.warning(f"Couldn't start replacement Julia worker: {e}")
+            return
+        with self.__lock:
+            if len(self.__idle) < self.size:
+                self.__idle.append(worker)
+                return
+        worker.kill()
+
+
+_julia_pool = None
+_julia_pool_lock = threading.Lock()
+
+def get_julia_pool():   #Um pool por processo do gunicorn, criado no primeiro uso
+    global _julia_pool
+    with _julia_pool_lock:
+        if _julia_pool is None:
+            _julia_pool = JuliaPool(
+                size=get_env_int("JULIA_POOL_SIZE", 1),
+                maxJobs=get_env_int("JULIA_POOL_MAX_JOBS", 200),
+                maxAge=get_env_int("JULIA_POOL_MAX_AGE", 900),
+                maxMemoryMb=get_env_int("JULIA_POOL_MAX_MEMORY_MB", 1024),
+                memoryLimitMb=memory_limit_mb(),
+            )
+            atexit.register(_julia_pool.shutdown)
+        return _julia_pool
@@ -0,0 +1,97 @@
+#Worker persistente usado pelo pool de Julia (juliapool.py). Cada submissão roda em um módulo novo, mas todas rodam no mesmo processo: métodos
+#definidos fora do módulo (em funções do Base ou do Core, pirataria de tipos), pacotes carregados, o ENV, o diretório atual e o logger global
+#continuariam valendo nos jobs seguintes. Depois de cada job o worker confere esses estados e avisa o servidor, que descarta o worker se algum
+#deles mudou. O gerador aleatório é semeado de novo a cada job, como em um processo novo. Outros estados globais alterados diretamente
+#(ex.: variáveis de outros módulos) não são detectados, por isso o pool é opcional (JULIA_POOL)
+#Protocolo (stdin/stdout):
+#  servidor -> worker: "<caminho do arquivo>\t<tamanho do código em bytes>\n" seguido do código
+#  worker -> servidor: "<marcador> <bytes do stdout> <bytes do stderr> <1 se o job alterou o estado do processo, senão 0>\n" seguido do stdout e do stderr capturados
+using Random
+
+const MARK = ARGS[1]
+const PROTOCOL_OUT = stdout
+
+struct SubmissionExit <: Exception   #exit() chamado pelo código: encerra só o job, sem mensagem de erro, como no "julia arquivo.jl"
+    code::Int
+end
+
+is_exit(err) = err isa SubmissionExit || (err isa LoadError && err.error isa SubmissionExit)
+
+function own_methods(m::Module)   #Métodos das funções, closures e construtores definidos no próprio módulo
+    own = Set{Method}()
+    for name in names(m; all=true)
+        isdefined(m, name) || continue
+        value = getfield(m, name)
+        if value isa Function && parentmodule(value) === m
+            union!(own, methods(value))
+        elseif value isa Type && parentmodule(value) === m
+            union!(own, methods(value))   #Construtores
+            if value isa DataType && value <: Function   #Closures: os métodos de chamada ficam na tabela de métodos do tipo
+                Base.visit(method -> method.module === m && push!(own, method), value.name.mt)
+            end
+        end
+    end
+    return own
+end
+
+function execute(path::String, code::String)   #Retorna (stdout, stderr, se o job alterou o estado do processo)
+    m = Module(:Submission)
+    Core.eval(m, :(include(p) = Base.include($m, p)))   #Module() não define include, usado para carregar o run_me_prof.jl
+    Core.eval(m, :(exit(code::Integer=0) = throw($SubmissionExit(code))))   #O Base.exit encerraria o worker
+    Random.seed!()
+    envBefore = copy(ENV)
+    dirBefore = pwd()
+    loggerBefore = Base.CoreLogging.global_logger()
+    methodsBefore = try own_methods(m) catch; nothing end   #nothing faz o worker ser descartado depois do job
+    worldBefore = Base.get_world_counter()   #Cada método criado (ou removido) em qualquer módulo avança o contador
+    outPath, outIo = mktemp()
+    errPath, errIo = mktemp()
+    try
+        redirect_stdout(outIo) do
+            redirect_stderr(errIo) do
+                try
+                    cd(dirname(path)) do
+                        Base.include_string(m, code, path)
+                    end
+                catch err
+                    if !is_exit(err)
+                        Base.display_error(stderr, err, catch_backtrace())   #Mesmo formato de erro do "julia arquivo.jl"
+                    end
+                end
+            end
+        end
+    finally
+        close(outIo)
+        close(errIo)
+    end
+    changed = true   #Na dúvida (ex.: o diretório atual foi apagado), o worker é descartado
+    try
+        newMethods = methodsBefore === nothing ? -1 : length(setdiff(own_methods(m), methodsBefore))
+        changed = Base.get_world_counter() - worldBefore > newMethods || ENV != envBefore || pwd() != dirBefore || Base.CoreLogging.global_logger() !== loggerBefore
+    catch
+    end
+    stdoutBytes = read(outPath)
+    stderrBytes = read(errPath)
+    rm(outPath)
+    rm(errPath)
+    return stdoutBytes, stderrBytes, changed
+end
+
+#Aquecimento: compila o caminho de include/captura de saída antes de o worker ficar disponível
+warmupDir = mktempdir()
+execute(joinpath(warmupDir, "warmup.jl"), "f(x) = x + 1\nf(1) == 2\n")
+rm(warmupDir; recursive=true)
+
+write(PROTOCOL_OUT, "$MARK READY\n")
+flush(PROTOCOL_OUT)
+
+while !eof(stdin)
+    header = readline(stdin)
+    path, codeLength = split(header, '\t')
+    code = String(read(stdin, parse(Int, codeLength)))
+    stdoutBytes, stderrBytes, changed = execute(String(path), code)
+    write(PROTOCOL_OUT, "$MARK $(length(stdoutBytes)) $(length(stderrBytes)) $(changed ? 1 : 0)\n")
+    write(PROTOCOL_OUT, stdoutBytes)
+    write(PROTOCOL_OUT, stderrBytes)
+    flush(PROTOCOL_OUT)
+end
@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+import os
+import time
+
+#Com PROMETHEUS_MULTIPROC_DIR definida (antes de o gunicorn subir os processos), cada processo grava os valores em arquivos
+#nesse diretório e o /metrics de qualquer processo soma os de todos. Sem ela, as métricas são só do processo que respondeu
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_DURATION = Histogram(
+    "worker_stage_duration_seconds",
+    "Duration of each evaluation stage",
+    ["language", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+PRE_PROCESS_RESULTS = Counter(
+    "worker_pre_process_rejections",
+    "Submissions rejected by the pre-processing, by code_status",
+    ["language", "code_status"],
+)
+TEST_CASE_RESULTS = Counter(
+    "worker_test_case_results",
+    "Test case results, by status_code",
+    ["language", "status_code"],
+)
+IN_FLIGHT_REQUESTS = Gauge(
+    "worker_in_flight_requests",
+    "Requests being handled",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+IN_FLIGHT_EVALUATIONS = Gauge(
+    "worker_in_flight_evaluations",
+    "Submissions being evaluated (includes streaming, bulk and asynchronous jobs)",
+    ["language"],
+    multiprocess_mode="livesum",
+)
+QUEUED_EVALUATIONS = Gauge(
+    "worker_queued_evaluations",
+    "Submissions waiting for a free evaluation slot",
+    ["language"],
+    multiprocess_mode="livesum",
+)
+SUBPROCESS_SPAWNS = Counter(
+    "worker_subprocess_spawns",
+    "Processes started to evaluate submissions, by command",
+    ["command"],
+)
+
+def language_label(langExtension: str):   #".py" -> "py"
+    return langExtension.lstrip(".")
+
+@contextmanager
+def observe_stage(language: str, stage: str, timings = None):   #Registra a duração do bloco, mesmo se ele gerar uma exceção. timings: RequestTimings da submissão, se pedido
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - start
+        STAGE_DURATION.labels(language, stage).observe(elapsed)
+        if timings is not None:
+            timings.add_stage(stage, elapsed)
+
+def latest_metrics():   #Corpo e content type da resposta do /metrics
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,36 +1,101 @@
 from baselanguage import BaseLanguage
-from exceptions import DangerException, CodeException, ImportException, PrintException
-from pathlib import Path
-from utils import is_running_in_container
+from exceptions import DangerException, CodeException, ImportException, PrintException, WorkerException, MemoryLimitException, InfrastructureException
+from utils import get_env_int
+from zygote import get_zygote_executor
+from banditscanner import get_bandit_scanner
+from codescanner import RuleScanner
+from metrics import SUBPROCESS_SPAWNS
+from timings import run_subprocess, StreamedSubprocess
+from resourcelimits import execution_limits
 import os
+import logging
 import json
 import subprocess
 import re
+import ast
+import uuid
+import warnings
+import threading
+import time
 #import sys
 
+TIME_LIMIT = 10   #Tempo limite (em segundos) para a execução de cada caso de teste
+BATCH_TIME_MARGIN = 1   #Segundos além do tempo limite de um caso que o processo do modo batch pode rodar, somando todos os casos
+MAX_LITERAL_LENGTH = 10000   #Valores maiores que isso não são guardados no cache de saídas do professor
+#O warnings.catch_warnings troca os filtros do processo inteiro e não é thread-safe: no SERVER_MODE=gthread, duas requisições compilando ao mesmo
+#tempo poderiam restaurar os filtros uma da outra. Com a trava, só uma compilação de código enviado fica dentro do bloco por vez
+COMPILE_WARNINGS_LOCK = threading.Lock()
+
+#Função incluída nos harnesses: devolve o repr do valor do professor apenas se ele puder ser reconstruído exatamente (usado pelo cache de saídas do professor)
+REFERENCE_LITERAL_FUNCTION = f"""
+def reference_literal(value):
+    try:
+        text = repr(value)
+        if len(text) <= {MAX_LITERAL_LENGTH} and "\\n" not in text:
+            rebuilt = ast.literal_eval(text)
+            if type(rebuilt) is type(value) and repr(rebuilt) == text:
+                return text
+    except Exception:
+        pass
+    return ""
+"""
+
+#Funções incluídas no harness do modo batch: uso de recursos de cada caso, medido dentro do próprio processo. O pico de memória (VmHWM) é zerado
+#antes de cada caso (clear_refs), então inclui o interpretador e o que os casos anteriores deixaram na memória
+CASE_USAGE_FUNCTIONS = """
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_kb():
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+"""
+
 class PythonLanguage(BaseLanguage):
     def __init__(self, langExtension:str):   
         self.__offsetCodeLines = 4
         self.__baseCodeLines = -1
+        self.__frameMark = ""
         super().__init__(langExtension)
+        self.supportsBatchMode = True
+        self.parallelWorkers = get_env_int("PYTHON_PARALLEL_WORKERS", 4)
+        self.timeLimit = self.defaultTimeLimit = TIME_LIMIT
     
-    def base_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, arg, returnType = ""):
+    def base_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, arg, returnType = "", expectedOutput = None):
         #print(f"baseCodeLines: {self.__baseCodeLines}")
         self.__baseCodeLines = len(baseCode.splitlines())
         baseCode = '\n'.join('        ' + linha for linha in baseCode.splitlines())     #Adicionando identação
-        resultArgs = f"""import traceback
+        importProfLine = f"from {name_file_professor} import {funcName} as {funcNameProf}"
+        expected = f"{funcNameProf}(*{arg})"
+        if expectedOutput and expectedOutput["literal"]:   #Valor do professor em cache: a solução não precisa ser importada nem executada
+            importProfLine = "pass"
+            expected = f"({expectedOutput['literal']})"
+        resultArgs = f"""import traceback, ast
 def execute_code():
     try:
-        from {name_file_professor} import {funcName} as {funcNameProf}
+        {importProfLine}
 {baseCode}
-        print({funcName}(*{arg}) == {funcNameProf}(*{arg}), flush=True)
+        print({funcName}(*{arg}) == {expected}, flush=True)
         print({funcName}(*{arg}), flush=True)
-        print({funcNameProf}(*{arg}), flush=True)
+        __expected = {expected}
+        print(__expected, flush=True)
+        print(reference_literal(__expected), flush=True)
         print("NoErrors", flush=True)
     except Exception as e:
         return e, traceback.extract_tb(e.__traceback__)
     return None, None
-
+{REFERENCE_LITERAL_FUNCTION}
 error, tb_list = execute_code()
 if error:
     tb_last = tb_list[-1]
@@ -39,53 +104,86 @@ if error:
     error_message = str(error)
     print(f"{{line_number}}\\n{{error_type}}\\n{{error_message}}", flush=True)"""
         return resultArgs
-    
+
+    def batch_code_with_args(self, baseCode: str, name_file_professor: str, funcName: str, funcNameProf: str, args: list, returnType = "", expectedOutputs = None):
+        #Gera um único harness com todos os casos de teste. As 4 primeiras linhas seguem o mesmo layout de base_code_with_args para manter o offset
+        self.__baseCodeLines = len(baseCode.splitlines())
+        self.__frameMark = uuid.uuid4().hex   #Marcador dos resultados no stdout (o código do aluno não consegue forjá-lo)
+        baseCode = '\n'.join('        ' + linha for linha in baseCode.splitlines())
+        testCasesList = '\n'.join(f"    lambda: {arg}," for arg in args)   #Lambdas para que os argumentos sejam recriados a cada chamada, como no modo normal
+        expectedOutputs = expectedOutputs or [None] * len(args)
+        expectedValuesList = '\n'.join(f"    lambda: ({expected['literal']})," if expected and expected["literal"] else "    None," for expected in expectedOutputs)
+        expectedOutputsList = '\n'.join(f"    {repr(expected['output'])}," if expected else "    None," for expected in expectedOutputs)
+        importProfLine = f"from {name_file_professor} import {funcName} as {funcNameProf}"
+        if all(expected and expected["literal"] for expected in expectedOutputs):
+            importProfLine = "pass"
+        resultArgs = f"""import traceback, json, ast, io, contextlib, warnings, time
+def execute_code(__index):
+    try:
+        {importProfLine}
+{baseCode}
+        __arg = __testCases[__index]
+        __expected = __expectedValues[__index]
+        __comparison = {funcName}(*__arg()) == (__expected() if __expected else {funcNameProf}(*__arg()))
+        __output = {funcName}(*__arg())
+        __expectedValue = __expected() if __expected else {funcNameProf}(*__arg())
+        return [str(__comparison), str(__output), str(__expectedValue), reference_literal(__expectedValue)], None
+    except Exception as e:
+        tb_last = traceback.extract_tb(e.__traceback__)[-1]
+        return None, [tb_last.lineno - {self.__offsetCodeLines}, type(e).__name__, str(e)]
+
+def professor_output(__index):
+    if __expectedOutputs[__index] is not None:
+        return __expectedOutputs[__index]
+    try:
+        from {name_file_professor} import {funcName}
+        return str({funcName}(*__testCases[__index]()))
+    except Exception:
+        return None
+{REFERENCE_LITERAL_FUNCTION}{CASE_USAGE_FUNCTIONS}
+__testCases = [
+{testCasesList}
+]
+
+__expectedValues = [
+{expectedValuesList}
+]
+
+__expectedOutputs = [
+{expectedOutputsList}
+]
+
+for __index in range(len(__testCases)):
+    frame = {{"index": __index, "outputs": None, "error": None, "stderr": "", "prof_output": None, "usage": None}}
+    __stderr = io.StringIO()
+    __peakReset = reset_peak_rss()
+    __start, __cpuStart = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stderr(__stderr), warnings.catch_warnings():   #O stderr de cada caso vai no próprio resultado e os avisos voltam a aparecer em cada caso, como em uma execução individual
+        frame["outputs"], frame["error"] = execute_code(__index)
+    __wallSeconds, __cpuSeconds = time.perf_counter() - __start, time.process_time() - __cpuStart
+    frame["usage"] = {{"wall_seconds": round(__wallSeconds, 6), "cpu_seconds": round(__cpuSeconds, 6), "max_rss_kb": peak_rss_kb() if __peakReset else None}}
+    if frame["outputs"] is None:
+        with contextlib.redirect_stderr(__stderr), warnings.catch_warnings():
+            frame["prof_output"] = professor_output(__index)
+    frame["stderr"] = __stderr.getvalue()
+    print("{self.__frameMark}" + json.dumps(frame), flush=True)"""
+        return resultArgs
+
     def professor_code_with_args(self, professorCode: str, funcName: str, funcNameProf: str, arg, returnType = ""):
         outputProf = f"\nprint({funcName}(*{arg}))"
         outputProfCode = professorCode + outputProf
         return professorCode, outputProfCode
     
     def evaluate_file(self, absolute_path: str):
-        sast_result_file_path = absolute_path.replace(".py", "") + "_result.json"
-        if is_running_in_container():
-            os.system(f'bandit -c bandit_config.yml "{absolute_path}"  -f json -o "{sast_result_file_path}"')    #Esta linha é para o container
-            test_output = json.load(Path(sast_result_file_path).open())
-        else:
-            try:
-                base_dir = Path(__file__).resolve().parent.parent
-                config_path = base_dir / "bandit_config.yml"
-
-                command = [
-                    "bandit",
-                    "-c", str(config_path),
-                    "-f", "json",
-                    "-o", sast_result_file_path,
-                    "-r", absolute_path
-                ]
-                
-                subprocess.run(command, check=True, capture_output=True, text=True)
-
-            except (subprocess.CalledProcessError, FileNotFoundError) as e:
-                raise CodeException(f"Bandit security scan failed: {e}")
-
-            try:
-                sast_result_path = Path(sast_result_file_path)
-                if not sast_result_path.exists() or sast_result_path.stat().st_size == 0:
-                    return
-
-                with sast_result_path.open(encoding='utf-8') as f:
-                    test_output = json.load(f)
-
-            except json.JSONDecodeError:
-                raise CodeException(f"Error decoding JSON from bandit output file.")
-            #os.system(f'bandit -c /home/nickashu/testeWorkerNode/remote-code-executor/worker_node/bandit_config.yml "{absolute_path}"  -f json -o "{sast_result_file_path}"')
-
-        #test_output = json.load(Path(sast_result_file_path).open())
-        metrics = test_output["metrics"]
-        HIGH_SEVERITY = metrics["_totals"]["SEVERITY.HIGH"]
-        MEDIUM_SEVERITY = metrics["_totals"]["SEVERITY.MEDIUM"]
-        LOW_SEVERITY = metrics["_totals"]["SEVERITY.LOW"]
-        UNDEFINED_SEVERITY = metrics["_totals"]["SEVERITY.UNDEFINED"]
+        try:
+            totals = get_bandit_scanner().severity_totals(absolute_path)   #Bandit no próprio processo, com o resultado em cache pelo hash do código
+        except Exception as e:
+            raise InfrastructureException(f"Bandit security scan failed: {e}")
+        
+        HIGH_SEVERITY = totals["HIGH"]
+        MEDIUM_SEVERITY = totals["MEDIUM"]
+        LOW_SEVERITY = totals["LOW"]
+        UNDEFINED_SEVERITY = totals["UNDEFINED"]
         DANGER_SCORE = HIGH_SEVERITY * 3 + MEDIUM_SEVERITY * 2 + LOW_SEVERITY * 1 + UNDEFINED_SEVERITY * 0
         TOTAL_WARNINGS = HIGH_SEVERITY + MEDIUM_SEVERITY + LOW_SEVERITY + UNDEFINED_SEVERITY
         if TOTAL_WARNINGS == 0:
@@ -96,17 +194,19 @@ if error:
             raise DangerException("Danger score is too high")
         return
     
-    def run_code(self, file_path: str, isProfessorCode: bool):
-        result = subprocess.run(["python3", f"{file_path}"], capture_output=True, text=True, timeout=10)
-        if result.stderr != "":
-            error_message = process_errors(result.stderr, self.__offsetCodeLines)
+    def run_code(self, file_path: str, isProfessorCode: bool, usage: dict = None):
+        stdout, stderr = execute_file(file_path, self.timeLimit, self.timings, usage, execution_limits(self.timeLimit))
+        if stderr != "":
+            error_message = process_errors(stderr, self.__offsetCodeLines)
+            if error_message.startswith("MemoryError"):
+                raise MemoryLimitException(error_message)
             raise CodeException(error_message)
         
-        outputs = result.stdout.split("\n")    #outputs terá o booleano informando se os outputs foram iguais, o output do estudante e o output do professor
+        outputs = stdout.split("\n")    #outputs terá o booleano informando se os outputs foram iguais, o output do estudante e o output do professor
         if isProfessorCode:
             return outputs[0]    #No caso de ter rodado apenas o código do professor
         
-        if "NoErrors" in result.stdout:
+        if "NoErrors" in stdout:
             outputs[0] = True if outputs[0].upper() == "TRUE" else False
             return outputs
         line_number = outputs[0]
@@ -116,36 +216,107 @@ if error:
         error = f"{error_type}: {error_message}"
         if self.__baseCodeLines != -1 and int(line_number) <= self.__baseCodeLines:
             error += f" on line {line_number}"
-            
+        if error_type == "MemoryError":
+            raise MemoryLimitException(error)
         raise CodeException(error)
     
+    def run_batch_code(self, file_path: str, numTestCases: int, usages: list = None):   #usages recebe o uso de recursos de cada caso, medido pelo próprio harness
+        #Retorna uma lista de (saída, saída do professor) na ordem dos casos de teste. A saída é a mesma lista retornada por run_code ou a exceção que ele geraria.
+        #O tempo limite de cada caso é controlado por aqui, matando o processo (um sinal dentro do interpretador poderia ser capturado pelo código do aluno),
+        #e o processo inteiro roda no máximo um tempo limite mais BATCH_TIME_MARGIN. Casos sem resultado (o processo morreu ou foi interrompido
+        #antes de chegar neles) não entram na lista e devem ser executados individualmente
+        process = StreamedSubprocess("python", ["python3", f"{file_path}"], self.timings, execution_limits(self.timeLimit))
+        processDeadline = time.monotonic() + self.timeLimit + BATCH_TIME_MARGIN
+        caseDeadline = time.monotonic() + self.timeLimit
+        frames = []
+        timedOut = False
+        try:
+            while len(frames) < numTestCases:
+                try:
+                    line = process.read_line(min(caseDeadline, processDeadline))
+                except subprocess.TimeoutExpired:
+                    timedOut = caseDeadline <= processDeadline   #Se foi o limite do processo, o caso atual e os seguintes rodam individualmente
+                    break
+                if line is None:   #O processo terminou antes de chegar aos casos restantes
+                    break
+                if line.startswith(self.__frameMark):
+                    frames.append(json.loads(line[len(self.__frameMark):]))
+                    caseDeadline = time.monotonic() + self.timeLimit
+        finally:
+            _, stderr = process.finish(0 if timedOut else processDeadline - time.monotonic())
+        if stderr != "":   #Saída de erro fora dos casos (ex.: SyntaxWarning na compilação do arquivo): run_code trata o stderr de cada caso individualmente
+            return []
+        
+        outcomes = []
+        for frame in frames:
+            if usages is not None:
+                usages.append(frame["usage"])
+            if frame["stderr"] != "":   #Mesmo tratamento do run_code
+                error_message = process_errors(frame["stderr"], self.__offsetCodeLines)
+                exceptionClass = MemoryLimitException if error_message.startswith("MemoryError") else CodeException
+                outcomes.append((exceptionClass(error_message), frame["prof_output"]))
+                continue
+            if frame["outputs"] is not None:
+                outputs = frame["outputs"]
+                outputs[0] = True if outputs[0].upper() == "TRUE" else False
+                outcomes.append((outputs, None))
+                continue
+            line_number, error_type, error_message = frame["error"]
+            error_message = error_message.replace("execute_code.<locals>.", "")
+            error = f"{error_type}: {error_message}"
+            if self.__baseCodeLines != -1 and int(line_number) <= self.__baseCodeLines:
+                error += f" on line {line_number}"
+            exceptionClass = MemoryLimitException if error_type == "MemoryError" else CodeException
+            outcomes.append((exceptionClass(error), frame["prof_output"]))
+        
+        if timedOut:   #A saída do professor é calculada pelo servidor, como no TLE de um caso individual
+            outcomes.append((subprocess.TimeoutExpired(file_path, self.timeLimit), None))
+        return outcomes
+    
+    def reference_output(self, codeOutput: list):
+        literal = codeOutput[3] if len(codeOutput) > 3 and codeOutput[3] else None
+        if literal is not None:   #Confere se o literal realmente corresponde à saída do professor antes de reaproveitá-lo em outros harnesses
+            try:
+                if len(literal) > MAX_LITERAL_LENGTH or str(ast.literal_eval(literal)) != codeOutput[2]:
+                    literal = None
+            except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+                literal = None
+        return {"output": codeOutput[2], "literal": literal}
     
-    def run_pre_process_code(self, file_path: str):   #Verificando erros de sintaxe
-        result = subprocess.run(["python3", f"{file_path}"], capture_output=True, text=True, timeout=10)
-        stderr = result.stderr
-        if "SyntaxError" in stderr:
+    def run_pre_process_code(self, file_path: str):   #Verificando erros de sintaxe (compilação no próprio processo, sem executar o código do aluno)
+        with open(file_path, "rb") as file:
+            source = file.read()
+        try:
+            with COMPILE_WARNINGS_LOCK, warnings.catch_warnings():
+                warnings.simplefilter("ignore")   #SyntaxWarning (ex.: escape inválido) não impede a execução
+                compile(source, file_path, "exec", dont_inherit=True)
+        except SyntaxError as e:
+            if type(e) is not SyntaxError:   #IndentationError e TabError não contêm "SyntaxError" na saída do interpretador, então não eram barrados aqui
+                return
             error_message = "SyntaxError:"
-            matches = list(re.finditer(r'line (\d+)', stderr))
-            if matches:
-                last_match = matches[-1]
-                line_number = int(last_match.group(1))
-                error_message += f"  on line {line_number}"
+            if e.lineno is not None:
+                error_message += f"  on line {e.lineno}"
             raise CodeException(error_message)
+        except (ValueError, RecursionError, MemoryError):   #O interpretador também não mostraria um SyntaxError nestes casos
+            return
     
     
     def pre_process_code(self, code: str, code_path: str):
-        code_without_comments = re.sub(r'(?<!["\'])#.*$', '', code, flags=re.MULTILINE)
-        code_without_comments = re.sub(r"'''[\s\S]*?'''|\"\"\"[\s\S]*?\"\"\"", '', code_without_comments, flags=re.MULTILINE)
-        code_without_comments = code_without_comments.strip()
-        print_regex = re.compile(r'\bprint\s*\(.*\)')
-        has_print = bool(print_regex.search(code_without_comments))
-        if has_print:
-            raise PrintException("")
-        verify_against_blacklist(code_without_comments)   #Verificando importações inválidas
+        check_code(code)   #Prints e importações inválidas em uma única passada pela AST (sem falsos positivos dentro de strings e comentários)
         self.run_pre_process_code(code_path)   #Verificando erros de sintaxe
         return code
     
 
+def execute_file(file_path: str, timeout: float, timings = None, usage: dict = None, limits = None):   #Retorna (stdout, stderr) da execução do arquivo. Com PYTHON_EXECUTOR=zygote, usa o processo pré-aquecido
+    if os.getenv("PYTHON_EXECUTOR", "subprocess") == "zygote":
+        try:
+            SUBPROCESS_SPAWNS.labels("python_fork").inc()   #Fork feito pelo zygote
+            return get_zygote_executor().run_file(file_path, timeout, timings, usage, limits)   #O zygote aplica os limites no filho depois do fork
+        except WorkerException as e:   #O pedido não chegou ao zygote, então o código ainda não rodou
+            logging.warning(f"Python zygote unavailable, running a new process: {e}")
+    result = run_subprocess("python", ["python3", f"{file_path}"], timeout, timings, usage, limits)
+    return result.stdout, result.stderr
+
 def process_errors(stderr: str, offSetLines: int):
     error_message = stderr.splitlines()[-1]
     return_message = error_message
@@ -157,23 +328,96 @@ def process_errors(stderr: str, offSetLines: int):
         return_message += f" on line {line_number}"
     return return_message
 
-def verify_against_blacklist(code: str):
-    blacklist = [
-        r'\bimport\s*\bos\b',                   # import os
-        r'\bimport\s*\bsubprocess\b',            # import subprocess
-        r'\bimport\s*\bsys\b',                   # import sys
-        r'\bimport\s*\bsocket\b',                # import socket
-        r'\bimport\s*\bthreading\b',             # import threading
-        r'\bimport\s*\bmultiprocessing\b',       # import multiprocessing
-        r'\bfrom\s+os\s+import\b',               # from os import ...
-        r'\bfrom\s+subprocess\s+import\b',       # from subprocess import ...
-        r'\bfrom\s+sys\s+import\b',              # from sys import ...
-        r'\bfrom\s+socket\s+import\b',           # from socket import ...
-        r'\bfrom\s+threading\s+import\b',        # from threading import ...
-        r'\bfrom\s+multiprocessing\s+import\b',  # from multiprocessing import ...
-        r'\bopen\s*\(',                          # open(...)
-    ]
-
-    for pattern in blacklist:
-        if re.search(pattern, code):
-            raise ImportException("Not allowed import or method found.")
\ No newline at end of file
+FORBIDDEN_MODULES = {"os", "subprocess", "sys", "socket", "threading", "multiprocessing"}
+FORBIDDEN_NAMES = {"open"}
+NAMESPACE_NAMES = {"builtins", "__builtins__"}
+NAMESPACE_FUNCTIONS = {"vars", "globals", "locals"}
+#Usadas apenas quando o código não pode ser analisado pela AST
+COMMENT_REGEX = re.compile(r'(?<!["\'])#.*$', flags=re.MULTILINE)
+DOCSTRING_REGEX = re.compile(r"'''[\s\S]*?'''|\"\"\"[\s\S]*?\"\"\"", flags=re.MULTILINE)
+FALLBACK_SCANNER = RuleScanner([
+    (r'\bprint\s*\(.*\)', PrintException, ""),
+    (r'\bimport\s*\b(os|subprocess|sys|socket|threading|multiprocessing)\b', ImportException, "Not allowed import or method found."),   # import os, import subprocess...
+    (r'\bfrom\s+(os|subprocess|sys|socket|threading|multiprocessing)\s+import\b', ImportException, "Not allowed import or method found."),   # from os import ...
+    (r'\bopen\s*\(', ImportException, "Not allowed import or method found."),   # open(...)
+])
+
+class SubmissionAnalyzer(ast.NodeVisitor):   #Procura chamadas de print, importações proibidas e open em uma única passada pela AST
+    def __init__(self):
+        self.hasPrint = False
+        self.hasForbidden = False
+
+    def visit_Import(self, node: ast.Import):   #import os / import json, os / import os.path as p
+        if any(alias.name.split(".")[0] in FORBIDDEN_MODULES for alias in node.names):
+            self.hasForbidden = True
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):   #from os import ... / from os.path import ... / from builtins import print
+        if node.level == 0 and node.module and node.module.split(".")[0] in FORBIDDEN_MODULES:
+            self.hasForbidden = True
+        for alias in node.names:
+            self.__check_name(alias.name)
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):   #Qualquer uso do nome, não só a chamada: também pega apelidos como "p = print"
+        if isinstance(node.ctx, ast.Load):
+            self.__check_name(node.id)
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node: ast.Attribute):   #builtins.print, __builtins__.print, io.open, os.open
+        self.__check_name(node.attr)
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node: ast.Subscript):   #__builtins__["print"], vars(builtins)["print"], builtins.__dict__["print"]
+        if is_namespace(node.value):
+            self.__check_string(node.slice)
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call):
+        func = node.func
+        if isinstance(func, ast.Name) and func.id == "getattr" and len(node.args) >= 2:   #getattr(builtins, "print")
+            self.__check_string(node.args[1])
+        if isinstance(func, ast.Attribute) and func.attr == "get" and is_namespace(func.value) and node.args:   #builtins.__dict__.get("print")
+            self.__check_string(node.args[0])
+        isDynamicImport = (isinstance(func, ast.Name) and func.id == "__import__") or (isinstance(func, ast.Attribute) and func.attr == "import_module")
+        if isDynamicImport and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):   #__import__("os"), importlib.import_module("os")
+            if node.args[0].value.split(".")[0] in FORBIDDEN_MODULES:
+                self.hasForbidden = True
+        self.generic_visit(node)
+
+    def __check_name(self, name: str):
+        if name == "print":
+            self.hasPrint = True
+        elif name in FORBIDDEN_NAMES:
+            self.hasForbidden = True
+
+    def __check_string(self, node: ast.AST):   #Nome passado como texto (getattr ou consulta ao dicionário dos builtins)
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            self.__check_name(node.value)
+
+def is_namespace(node: ast.AST):   #Expressões que dão acesso aos builtins por nome: builtins, __builtins__, X.__dict__, vars(...), globals() e locals()
+    if isinstance(node, ast.Name):
+        return node.id in NAMESPACE_NAMES
+    if isinstance(node, ast.Attribute):
+        return node.attr == "__dict__"
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return node.func.id in NAMESPACE_FUNCTIONS
+    return False
+
+
+def check_code(code: str):   #Gera PrintException ou ImportException
+    try:
+        with COMPILE_WARNINGS_LOCK, warnings.catch_warnings():   #Ver COMPILE_WARNINGS_LOCK
+            warnings.simplefilter("ignore")
+            tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):   #Código que não compila: verificação por expressões regulares (o erro de sintaxe é reportado depois)
+        code_without_comments = COMMENT_REGEX.sub('', code)
+        code_without_comments = DOCSTRING_REGEX.sub('', code_without_comments).strip()
+        FALLBACK_SCANNER.check(code_without_comments)
+        return
+    analyzer = SubmissionAnalyzer()
+    analyzer.visit(tree)
+    if analyzer.hasPrint:
+        raise PrintException("")
+    if analyzer.hasForbidden:
+        raise ImportException("Not allowed import or method found.")
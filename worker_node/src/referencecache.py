@@ -0,0 +1,36 @@
+from collections import OrderedDict
+from utils import get_env_int
+import hashlib
+import threading
+
+class ReferenceOutputCache():   #Cache LRU das saídas da solução do professor. A saída de um caso de teste é sempre a mesma para um problema
+    def __init__(self, maxSize: int):
+        self.maxSize = maxSize
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def make_key(langExtension: str, professorCode: str, funcName: str, returnType: str, testCase):
+        professorHash = hashlib.sha256(professorCode.encode()).hexdigest()
+        return (langExtension, professorHash, funcName, returnType, str(testCase))
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry: dict, replace: bool = True):   #entry: {"output": saída do professor, "literal": valor reutilizável no harness ou None}
+        if self.maxSize <= 0:
+            return
+        with self.__lock:
+            if key in self.__entries and not replace:
+                return
+            self.__entries[key] = entry
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxSize:
+                self.__entries.popitem(last=False)
+
+
+reference_cache = ReferenceOutputCache(get_env_int("REFERENCE_CACHE_SIZE", 0))   #Desativado por padrão: preencher o cache custa uma execução do professor por caso na primeira submissão de cada problema
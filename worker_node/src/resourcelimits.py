@@ -0,0 +1,66 @@
+from utils import get_env_flag, get_env_int
+import logging
+import math
+import shutil
+
+PRLIMIT = shutil.which("prlimit")   #util-linux: aplica os limites e faz o exec do comando no mesmo processo (sem preexec_fn, que não é seguro com threads)
+if PRLIMIT is None:
+    logging.warning("prlimit not found, student code will run without rlimits")
+RUSAGE_LAUNCHER = shutil.which("rusage-launcher")   #rusagelauncher.c (compilado no Dockerfile): mede o pico de memória do código sem herdar o do servidor
+if RUSAGE_LAUNCHER is None:
+    logging.warning("rusage-launcher not found, max_rss_kb will not be measured")
+
+class ResourceLimits():   #rlimits de cada execução do código enviado (aluno e professor)
+    def __init__(self, cpuSeconds: int, memoryMb: int, maxProcesses: int):   #0 desativa o limite
+        self.cpuSeconds = cpuSeconds
+        self.memoryMb = memoryMb
+        self.maxProcesses = maxProcesses
+
+    def wrap(self, args: list):   #Comando que executa args já com os limites
+        options = []
+        if self.cpuSeconds > 0:   #O limite "hard" fica 1s acima: o processo recebe SIGXCPU (tratado como TLE) antes do SIGKILL
+            options.append(f"--cpu={self.cpuSeconds}:{self.cpuSeconds + 1}")
+        if self.memoryMb > 0:
+            options.append(f"--as={self.memoryMb * 1024 * 1024}")
+        if self.maxProcesses > 0:   #Conta todos os processos do usuário e não vale para o root (o usuário do container)
+            options.append(f"--nproc={self.maxProcesses}")
+        if not options or PRLIMIT is None:
+            return args
+        return [PRLIMIT, *options, "--", *args]
+
+    def exceeded_cpu(self, cpuSeconds: float):   #Um SIGKILL com o tempo de CPU no limite veio do limite "hard" de CPU (TLE), e não da falta de memória
+        return self.cpuSeconds > 0 and cpuSeconds is not None and cpuSeconds >= self.cpuSeconds
+
+
+def execution_limits(timeLimit: float, limitMemory: bool = True):
+    #Limites definidos pelas variáveis de ambiente, ou None com EXECUTION_LIMITS=False.
+    #limitMemory=False para runtimes que reservam muito espaço de endereçamento ao iniciar (AddressSanitizer, Julia)
+    if not get_env_flag("EXECUTION_LIMITS", True):
+        return None
+    return ResourceLimits(
+        get_env_int("EXECUTION_CPU_LIMIT", math.ceil(timeLimit) + 1),   #O RLIMIT_CPU é em segundos inteiros
+        memory_limit_mb() if limitMemory else 0,
+        get_env_int("EXECUTION_NPROC_LIMIT", 0),   #Desativado por padrão: o RLIMIT_NPROC não tem efeito no root, que é quem roda o worker no container
+    )
+
+def memory_limit_mb():   #Limite de memória de cada execução em MB (0 sem limite). Também usado pelo pool de Julia, que controla a memória dos workers por conta própria
+    if not get_env_flag("EXECUTION_LIMITS", True):
+        return 0
+    return get_env_int("EXECUTION_MEMORY_LIMIT_MB", 1024)
+
+def resource_usage(wallSeconds: float, rusage, maxRssKb: int = None):   #Uso de recursos de uma execução, devolvido em cada caso de teste
+    #maxRssKb: pico de memória medido pelo rusage-launcher (o ru_maxrss do rusage herda o pico do processo que fez o fork)
+    usage = {'wall_seconds': round(wallSeconds, 6), 'cpu_seconds': None, 'max_rss_kb': maxRssKb}
+    if rusage is not None:
+        usage['cpu_seconds'] = round(rusage.ru_utime + rusage.ru_stime, 6)
+    return usage
+
+def rss_kb(pid: int):   #Memória residente atual do processo em KB (0 se ele não existe mais)
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
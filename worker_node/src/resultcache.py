@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from utils import get_env_int
+import hashlib
+import json
+import threading
+import time
+
+class ResultCache():   #Cache LRU das respostas completas do /multi_process, para reenvios do mesmo código e retentativas do servidor web
+    def __init__(self, ttl: int, maxBytes: int):
+        self.ttl = ttl
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()   #chave -> (instante de expiração, corpo da resposta)
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def make_key(lang: str, problemId: str, code: str, professorCode: str, funcName: str, testCases: list, returnType: str):
+        codeHash = hashlib.sha256(normalize_code(code).encode()).hexdigest()
+        professorHash = hashlib.sha256((professorCode or "").encode()).hexdigest()
+        return (lang, problemId, codeHash, professorHash, funcName, json.dumps(testCases), returnType)
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():   #Expirada
+                self.__remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, body: bytes):
+        if self.maxBytes <= 0 or len(body) > self.maxBytes:
+            return
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (time.monotonic() + self.ttl, body)
+            self.__bytes += len(body)
+            while self.__bytes > self.maxBytes:
+                self.__remove(next(iter(self.__entries)))
+
+    def stats(self):
+        with self.__lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.__entries), 'bytes': self.__bytes}
+
+    def __remove(self, key):
+        _, body = self.__entries.pop(key)
+        self.__bytes -= len(body)
+
+
+def normalize_code(code: str):   #Mesma normalização da leitura em modo texto (open(...).read()) feita antes do pré-processamento: só o fim de linha muda
+    return code.replace("\r\n", "\n").replace("\r", "\n")
+
+
+result_cache = ResultCache(get_env_int("RESULT_CACHE_TTL", 600), get_env_int("RESULT_CACHE_MAX_MB", 64) * 1024 * 1024)
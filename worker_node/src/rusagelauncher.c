@@ -0,0 +1,107 @@
+//Lançador usado pelo servidor para medir o pico de memória (ru_maxrss) do código enviado. No Linux, o pico de um processo começa com o do
+//processo que fez o fork (o exec guarda o pico da memória antiga), então medido direto do servidor ele seria o do próprio gunicorn. Este
+//processo é pequeno: o filho criado por ele parte de um pico mínimo e o wait4 devolve o pico do código.
+//Uso: rusage-launcher <fd> comando [argumentos...]
+//Escreve no fd "<pid do filho>\n" assim que ele é criado e "<ru_maxrss do filho em KB>\n" quando ele termina, e sai com o mesmo status do filho
+//(o mesmo código de saída ou o mesmo sinal). Um SIGTERM no lançador mata o filho com SIGKILL (timeout) e o filho morre junto se o lançador morrer.
+//Compilado no Dockerfile: gcc -O2 -o /usr/local/bin/rusage-launcher rusagelauncher.c
+#define _GNU_SOURCE
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static volatile pid_t child = 0;
+
+static void kill_child(int sig) {
+    (void) sig;
+    if (child > 0)
+        kill(child, SIGKILL);
+}
+
+static void write_all(int fd, const char *text) {
+    size_t length = strlen(text);
+    while (length > 0) {
+        ssize_t written = write(fd, text, length);
+        if (written < 0) {
+            if (errno == EINTR)
+                continue;
+            return;   //O servidor fechou o pipe: o filho ainda é esperado normalmente
+        }
+        text += written;
+        length -= written;
+    }
+}
+
+int main(int argc, char **argv) {
+    if (argc < 3) {
+        fprintf(stderr, "usage: rusage-launcher <fd> command [args...]\n");
+        return 127;
+    }
+    int reportFd = atoi(argv[1]);
+    fcntl(reportFd, F_SETFD, FD_CLOEXEC);   //O código executado não herda o fd
+    pid_t launcher = getpid();
+
+    sigset_t terminate, previous;   //O SIGTERM fica bloqueado até o pid do filho ser conhecido
+    sigemptyset(&terminate);
+    sigaddset(&terminate, SIGTERM);
+    sigprocmask(SIG_BLOCK, &terminate, &previous);
+    struct sigaction action;
+    memset(&action, 0, sizeof action);
+    action.sa_handler = kill_child;
+    sigemptyset(&action.sa_mask);
+    sigaction(SIGTERM, &action, NULL);
+
+    pid_t pid = fork();
+    if (pid < 0) {
+        perror("rusage-launcher: fork");
+        return 127;
+    }
+    if (pid == 0) {
+        signal(SIGTERM, SIG_DFL);
+        sigprocmask(SIG_SETMASK, &previous, NULL);
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+        if (getppid() != launcher)   //O lançador morreu antes do prctl
+            _exit(127);
+        execvp(argv[2], argv + 2);
+        fprintf(stderr, "rusage-launcher: %s: %s\n", argv[2], strerror(errno));
+        _exit(127);
+    }
+    child = pid;
+    char text[32];
+    snprintf(text, sizeof text, "%d\n", (int) pid);
+    write_all(reportFd, text);
+    sigprocmask(SIG_SETMASK, &previous, NULL);
+
+    int status;
+    struct rusage usage;
+    while (wait4(pid, &status, 0, &usage) < 0) {
+        if (errno != EINTR) {
+            perror("rusage-launcher: wait4");
+            return 127;
+        }
+    }
+    snprintf(text, sizeof text, "%ld\n", usage.ru_maxrss);
+    write_all(reportFd, text);
+    close(reportFd);
+
+    if (WIFSIGNALED(status)) {   //Repete o sinal para que o servidor veja o mesmo status (ex.: SIGXCPU é TLE), sem gerar core dump
+        int sig = WTERMSIG(status);
+        struct rlimit noCore = {0, 0};
+        setrlimit(RLIMIT_CORE, &noCore);
+        signal(sig, SIG_DFL);
+        sigset_t only;
+        sigemptyset(&only);
+        sigaddset(&only, sig);
+        sigprocmask(SIG_UNBLOCK, &only, NULL);
+        kill(launcher, sig);
+        return 128 + sig;
+    }
+    return WEXITSTATUS(status);
+}
@@ -1,20 +1,29 @@
-from pathlib import Path
-from flask import Flask, request, abort, jsonify
+from pathlib import Path, PurePosixPath
+from flask import Flask, request, abort, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import os
 import zipfile
+import io
+import threading
 import socket
 import subprocess
-from exceptions import DangerException, CodeException, PrintException, ImportException
+from exceptions import DangerException, CodeException, PrintException, ImportException, MemoryLimitException, KernelKillException, InfrastructureException
 from flask_cors import CORS
-import uuid
 import logging
 import json
 from languagefactory import LanguageFactory
-from utils import is_running_in_container
-import google.auth.transport.requests
-import google.oauth2.id_token
+from utils import get_env_flag, get_env_int
+from referencecache import reference_cache
+from timelimits import reference_runtime_cache, adaptive_time_limits_enabled, adaptive_time_limit
+from resultcache import result_cache
+from workspacepool import get_workspace_pool
+from jobstore import job_store, FINISHED_STATUSES
+from metrics import PRE_PROCESS_RESULTS, TEST_CASE_RESULTS, IN_FLIGHT_REQUESTS, IN_FLIGHT_EVALUATIONS, QUEUED_EVALUATIONS, language_label, observe_stage, latest_metrics
+from timings import RequestTimings
+from tokenverifier import get_token_verifier
+from concurrency import get_evaluation_semaphore
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logging.basicConfig(level=logging.INFO)
 BASE_DIR = (Path(__file__).parent / "code").absolute()
@@ -22,6 +31,14 @@ BASE_DIR = (Path(__file__).parent / "code").absolute()
 app = Flask(__name__)
 CORS(app)
 
+@app.before_request
+def _track_request_start():
+    IN_FLIGHT_REQUESTS.labels(request.endpoint or "unknown").inc()
+
+@app.teardown_request
+def _track_request_end(exception):   #Nas respostas em streaming, só roda quando o corpo termina de ser enviado
+    IN_FLIGHT_REQUESTS.labels(request.endpoint or "unknown").dec()
+
 def _valid_file(filename):
     logging.info(filename)
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'zip'}
@@ -29,46 +46,275 @@ def _valid_file(filename):
 name_file_student = "run_me"
 name_file_professor = "run_me_prof"
 
-def _unzip_file_codes(folder: Path, file_name: str, language_extension: str, professor_code: bool):
-    with zipfile.ZipFile(f"{folder}/{file_name}", mode="r") as archive:
-        archive.extractall(path=folder.as_posix())
-
-    pathBaseCode = (folder / name_file_student).as_posix()
-    newPathBaseCode = pathBaseCode + language_extension
-    if professor_code:
-        pathProfessorCode = (folder / name_file_professor).as_posix()
-        newPathProfessorCode = pathProfessorCode + language_extension
-        os.rename(pathBaseCode, newPathBaseCode)
-        os.rename(pathProfessorCode, newPathProfessorCode)
-        return newPathBaseCode, newPathProfessorCode
-    os.rename(pathBaseCode, newPathBaseCode)
-    return newPathBaseCode
-
-def delete_files_from_directory(folder: Path):
-    for item in os.listdir(folder):
-        item_path = os.path.join(folder, item)
-        if os.path.isfile(item_path):
-            os.remove(item_path)
-        elif os.path.isdir(item_path):
-            delete_files_from_directory(item_path)
-            os.rmdir(item_path)
-
-def _delete_temp_files(folder: Path):   #Deletando as pastas temporárias criadas
-    delete_files_from_directory(folder)
-    os.rmdir(folder.as_posix())
-    os.rmdir(folder.parent.as_posix())
+MAX_CODE_BYTES = get_env_int("SUBMISSION_MAX_CODE_KB", 512) * 1024   #Tamanho máximo do código descompactado
+MAX_ARCHIVE_MEMBERS = get_env_int("SUBMISSION_MAX_ARCHIVE_MEMBERS", 16)
+EVALUATION_QUEUE_TIMEOUT = get_env_int("EVALUATION_QUEUE_TIMEOUT", 120)   #Segundos que uma submissão espera por uma vaga de avaliação antes do 503
+
+def _read_submission_code(archiveBytes: bytes):
+    #Lê o código do aluno (membro "run_me") direto do zip em memória, sem extrair nada para o disco. Gera ValueError se o zip não for aceito
+    with zipfile.ZipFile(io.BytesIO(archiveBytes), mode="r") as archive:
+        members = archive.infolist()
+        if len(members) > MAX_ARCHIVE_MEMBERS:
+            raise ValueError(f"Too many files in the archive ({len(members)})")
+        for member in members:   #Nomes que escapariam do diretório de trabalho se o zip fosse extraído
+            name = member.filename.replace("\\", "/")
+            if name.startswith("/") or ".." in PurePosixPath(name).parts:
+                raise ValueError(f"Invalid file name in the archive: {member.filename}")
+        studentMembers = [member for member in members if member.filename == name_file_student]   #Nome exato, na raiz do zip (o getinfo pegaria o último de vários membros com o mesmo nome)
+        if len(studentMembers) != 1:
+            raise ValueError(f"The archive must contain exactly one {name_file_student} file (found {len(studentMembers)})")
+        info = studentMembers[0]
+        if info.file_size > MAX_CODE_BYTES:
+            raise ValueError(f"Submitted code is too large ({info.file_size} bytes)")
+        with archive.open(info) as file:
+            data = file.read(MAX_CODE_BYTES + 1)   #O tamanho declarado no zip pode ser falso (zip bomb)
+        if len(data) > MAX_CODE_BYTES:
+            raise ValueError("Submitted code is too large")
+    return data.decode().replace("\r\n", "\n").replace("\r", "\n")   #Mesmo resultado da leitura do arquivo em modo texto
+
+def _delete_temp_files(folder: Path):   #Devolvendo o diretório de trabalho ao pool (o conteúdo é apagado de uma vez)
+    get_workspace_pool().release(folder)
 
 def _create_temp_dir():
-    unique_id = uuid.uuid4().hex
-    if is_running_in_container():
-        os.makedirs(unique_id + "/code")     #Esta linha é para o container
+    return get_workspace_pool().checkout()
+
+
+def _test_case_outcomes(objLang, finalCode: str, professorCode: str, funcName: str, testCases: list, returnType: str, folder: Path, submitted_code_path: str, professor_code_path: str):
+    #Gera (caso de teste, saída, saída do professor, uso de recursos) na ordem original dos casos de teste, parando no primeiro TLE
+    batchOutcomes = []
+    if objLang.supportsBatchMode and get_env_flag("BATCH_MODE"):
+        batchOutcomes = _run_batch_test_cases(objLang, finalCode, professorCode, funcName, testCases, returnType, submitted_code_path, professor_code_path)
+    for testCase, (codeOutput, profOutput, usage) in zip(testCases, batchOutcomes):
+        yield testCase, codeOutput, profOutput, usage
+        if isinstance(codeOutput, subprocess.TimeoutExpired):
+            return
+    
+    remainingTestCases = list(enumerate(testCases))[len(batchOutcomes):]   #Sem modo batch ou o harness parou antes destes casos
+    workers = objLang.parallelWorkers if get_env_flag("PARALLEL_MODE") else 1
+    if workers <= 1 or len(remainingTestCases) <= 1:
+        for index, testCase in remainingTestCases:
+            codeOutput, profOutput, usage = _run_test_case(objLang, finalCode, professorCode, funcName, testCase, returnType, submitted_code_path, professor_code_path)
+            yield testCase, codeOutput, profOutput, usage
+            if isinstance(codeOutput, subprocess.TimeoutExpired):
+                return
+        return
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:   #Cada caso usa seus próprios arquivos (run_me_<índice>), então podem rodar ao mesmo tempo
+        futures = []
+        for index, testCase in remainingTestCases:
+            casePaths = _test_case_paths(folder, index, objLang.langExtension)
+            futures.append(executor.submit(_run_test_case, objLang, finalCode, professorCode, funcName, testCase, returnType, *casePaths))
+        try:
+            for (index, testCase), future in zip(remainingTestCases, futures):
+                codeOutput, profOutput, usage = future.result()
+                yield testCase, codeOutput, profOutput, usage
+                if isinstance(codeOutput, subprocess.TimeoutExpired):   #Cancela os casos que ainda não começaram, como no modo sequencial
+                    return
+        finally:
+            for future in futures:
+                future.cancel()
+
+def _prepare_professor_code(objLang, professorCode: str, funcName: str):   #Otimização opcional: se falhar, a avaliação segue pelo caminho normal
+    try:
+        with observe_stage(language_label(objLang.langExtension), "prepare_professor_code", objLang.timings):
+            objLang.prepare_professor_code(professorCode, funcName, funcName + "_prof")
+    except Exception as e:
+        logging.warning(f"Couldn't prepare the solution code: {e}")
+
+def _prepare_test_cases(objLang, professorCode: str, funcName: str, testCases: list, returnType: str, submitted_code_path: str, professor_code_path: str):   #Uma vez por submissão, antes dos casos de teste
+    _prepare_professor_code(objLang, professorCode, funcName)
+    if adaptive_time_limits_enabled():
+        _apply_adaptive_time_limit(objLang, professorCode, funcName, testCases, returnType, submitted_code_path, professor_code_path)
+    if reference_cache.maxSize > 0:
+        _seed_reference_outputs(objLang, professorCode, funcName, testCases, returnType, submitted_code_path, professor_code_path)
+
+def _evaluation_rounds(numTestCases: int, smokeCases: int):
+    #Índices dos casos de teste de cada rodada. No modo smoke, uma amostra determinística (espalhada pela lista, incluindo o primeiro e o último caso)
+    #roda antes, e os demais só rodam se todos os casos da amostra passarem
+    if smokeCases <= 0 or smokeCases >= numTestCases:
+        return [list(range(numTestCases))]
+    if smokeCases == 1:
+        sample = [0]
+    else:
+        sample = sorted({round(i * (numTestCases - 1) / (smokeCases - 1)) for i in range(smokeCases)})
+    return [sample, [index for index in range(numTestCases) if index not in sample]]
+
+def _apply_adaptive_time_limit(objLang, professorCode: str, funcName: str, testCases: list, returnType: str, submitted_code_path: str, professor_code_path: str):
+    #Reduz o tempo limite da submissão para um múltiplo do tempo da solução do professor, medido uma única vez por problema
+    runtimeKey = reference_runtime_cache.make_key(objLang.langExtension, professorCode, funcName, returnType, testCases)
+    found, referenceSeconds = reference_runtime_cache.get(runtimeKey)
+    if not found:
+        referenceSeconds = _measure_reference_runtime(objLang, professorCode, funcName, testCases, returnType, submitted_code_path, professor_code_path)
+        reference_runtime_cache.put(runtimeKey, referenceSeconds)
+    objLang.timeLimit = adaptive_time_limit(referenceSeconds, objLang.defaultTimeLimit)
+
+def _measure_reference_runtime(objLang, professorCode: str, funcName: str, testCases: list, returnType: str, submitted_code_path: str, professor_code_path: str):
+    #Maior tempo de parede da solução do professor entre os casos de teste, ou None se ela não puder ser medida
+    with observe_stage(language_label(objLang.langExtension), "measure_reference_runtime", objLang.timings):
+        return _run_reference_solution(objLang, professorCode, funcName, testCases, returnType, submitted_code_path, professor_code_path)
+
+def _seed_reference_outputs(objLang, professorCode: str, funcName: str, testCases: list, returnType: str, submitted_code_path: str, professor_code_path: str):
+    #Saídas do professor que ainda não estão em cache, calculadas uma vez por problema. Os casos de teste das submissões seguintes usam o valor guardado
+    missingTestCases = [testCase for testCase in testCases if reference_cache.get(reference_cache.make_key(objLang.langExtension, professorCode, funcName, returnType, testCase)) is None]
+    if missingTestCases:
+        with observe_stage(language_label(objLang.langExtension), "reference_outputs", objLang.timings):
+            _run_reference_solution(objLang, professorCode, funcName, missingTestCases, returnType, submitted_code_path, professor_code_path)
+
+def _run_reference_solution(objLang, professorCode: str, funcName: str, testCases: list, returnType: str, submitted_code_path: str, professor_code_path: str):
+    #Executa a solução do professor no lugar do código do aluno, com o mesmo harness (que também chama a solução para comparar), e retorna
+    #o maior tempo de parede entre os casos de teste, ou None se ela não puder ser medida. Só estas execuções, sem nenhum código do aluno, guardam
+    #a saída completa no cache de saídas do professor: a saída de um harness com o código do aluno pode ter sido forjada por ele
+    funcNameProf = funcName + "_prof"
+    professorFileName = Path(professor_code_path).stem
+    slowest = 0.0
+    try:
+        for testCase in testCases:
+            codeArgs = objLang.base_code_with_args(professorCode, professorFileName, funcName, funcNameProf, testCase, returnType)
+            professorCodeArgs, _ = objLang.professor_code_with_args(professorCode, funcName, funcNameProf, testCase, returnType)
+            with open(submitted_code_path, 'w') as file:
+                file.write(codeArgs)
+            with open(professor_code_path, 'w') as file:
+                file.write(professorCodeArgs)
+            usage = {}
+            try:
+                codeOutput = objLang.run_code(submitted_code_path, isProfessorCode=False, usage=usage)
+                referenceKey = reference_cache.make_key(objLang.langExtension, professorCode, funcName, returnType, testCase)
+                reference_cache.put(referenceKey, objLang.reference_output(codeOutput))
+            except CodeException:   #Caso em que a solução gera erro: o tempo até o erro ainda conta
+                pass
+            if 'wall_seconds' not in usage:   #Não chegou a executar (ex.: erro de compilação)
+                return None
+            slowest = max(slowest, usage['wall_seconds'])
+    except Exception as e:
+        logging.warning(f"Couldn't run the solution code, using the default time limit and no cached outputs: {e}")
+        return None
+    return slowest
+
+def _test_case_paths(folder: Path, index: int, language_extension: str):
+    submitted_code_path = (folder / f"{name_file_student}_{index}").as_posix() + language_extension
+    professor_code_path = (folder / f"{name_file_professor}_{index}").as_posix() + language_extension
+    return submitted_code_path, professor_code_path
+
+def _run_test_case(objLang, finalCode: str, professorCode: str, funcName: str, testCase, returnType: str, submitted_code_path: str, professor_code_path: str):
+    #Retorna a saída de run_code (ou a exceção gerada por ele), a saída do professor, que só é calculada quando o caso de teste falha com erro,
+    #e o uso de recursos da execução do código do aluno (None se não foi medido)
+    funcNameProf = funcName + "_prof"
+    language = language_label(objLang.langExtension)
+    professorFileName = Path(professor_code_path).stem
+    referenceKey = reference_cache.make_key(objLang.langExtension, professorCode, funcName, returnType, testCase)
+    expectedOutput = reference_cache.get(referenceKey)
+    usage = {}
+    try:
+        with observe_stage(language, "harness", objLang.timings):
+            codeArgs = objLang.base_code_with_args(finalCode, professorFileName, funcName, funcNameProf, testCase, returnType, expectedOutput)
+            professorCodeArgs, _ = objLang.professor_code_with_args(professorCode, funcName, funcNameProf, testCase, returnType)
+            
+            with open(submitted_code_path, 'w') as file:
+                file.write(codeArgs)   #Escrevendo o código com os argumentos para ser testado
+            with open(professor_code_path, 'w') as file:
+                file.write(professorCodeArgs)
+        with observe_stage(language, "run_code", objLang.timings):
+            codeOutput = objLang.run_code(submitted_code_path, isProfessorCode=False, usage=usage)
+        return codeOutput, None, usage or None
+    except Exception as e:
+        codeOutput = e
+    
+    if expectedOutput is not None:   #A solução do professor não precisa rodar de novo
+        return codeOutput, expectedOutput["output"], usage or None
+    return codeOutput, _professor_output(objLang, professorCode, funcName, testCase, returnType, professor_code_path), usage or None
+
+def _professor_output(objLang, professorCode: str, funcName: str, testCase, returnType: str, professor_code_path: str):
+    #Executa apenas a solução do professor no caso de teste (usada quando o caso falha e a saída dela não está em cache)
+    try:
+        _, outputProfessorCodeArgs = objLang.professor_code_with_args(professorCode, funcName, funcName + "_prof", testCase, returnType)
+        with open(professor_code_path, 'w') as file:
+            file.write(outputProfessorCodeArgs)
+        with observe_stage(language_label(objLang.langExtension), "professor_run", objLang.timings):
+            profOutput = objLang.run_code(professor_code_path, True)
+    except Exception:
+        return 'Solution code error! (durante caso de teste)'
+    referenceKey = reference_cache.make_key(objLang.langExtension, professorCode, funcName, returnType, testCase)
+    reference_cache.put(referenceKey, {"output": profOutput, "literal": None}, replace=False)
+    return profOutput
+
+def _run_batch_test_cases(objLang, finalCode: str, professorCode: str, funcName: str, testCases: list, returnType: str, submitted_code_path: str, professor_code_path: str):
+    #Executa todos os casos de teste de uma vez. Retorna (saída, saída do professor, uso de recursos) dos casos que o harness conseguiu processar
+    if not testCases:
+        return []
+    funcNameProf = funcName + "_prof"
+    referenceKeys = [reference_cache.make_key(objLang.langExtension, professorCode, funcName, returnType, testCase) for testCase in testCases]
+    expectedOutputs = [reference_cache.get(referenceKey) for referenceKey in referenceKeys]
+    language = language_label(objLang.langExtension)
+    usages = []   #Uso de recursos de cada caso, na ordem dos resultados (medido pelo harness em Python e por processo em C)
+    try:
+        with observe_stage(language, "harness", objLang.timings):
+            codeArgs = objLang.batch_code_with_args(finalCode, name_file_professor, funcName, funcNameProf, testCases, returnType, expectedOutputs)
+            professorCodeArgs, _ = objLang.professor_code_with_args(professorCode, funcName, funcNameProf, testCases[0], returnType)
+            with open(submitted_code_path, 'w') as file:
+                file.write(codeArgs)
+            with open(professor_code_path, 'w') as file:
+                file.write(professorCodeArgs)
+        with observe_stage(language, "run_batch_code", objLang.timings):
+            outcomes = objLang.run_batch_code(submitted_code_path, len(testCases), usages)
+    except Exception as e:
+        logging.warning(f"Batch mode failed, running test cases one by one: {e}")
+        return []
+    
+    batchOutcomes = []
+    for index, (expectedOutput, (codeOutput, profOutput)) in enumerate(zip(expectedOutputs, outcomes)):
+        #A saída do professor vinda do harness só é mostrada, sem ir para o cache: o mesmo processo também rodou o código do aluno
+        if not isinstance(codeOutput, list) and profOutput is None:
+            if expectedOutput is not None:
+                profOutput = expectedOutput["output"]
+            else:   #Ex.: TLE, em que o processo do harness foi morto
+                profOutput = _professor_output(objLang, professorCode, funcName, testCases[index], returnType, professor_code_path)
+        usage = usages[index] if index < len(usages) else None
+        batchOutcomes.append((codeOutput, profOutput, usage or None))
+    return batchOutcomes
+
+def _result_cache_key(archiveBytes: bytes, lang: str, problem_id: str, professorCode: str, funcName: str, testCases: list, returnType: str):
+    #Lê o código do aluno direto do zip enviado, sem criar arquivos. Retorna None se a submissão não puder ser identificada
+    try:
+        code = _read_submission_code(archiveBytes)
+    except Exception:
+        return None
+    return result_cache.make_key(lang, problem_id, code, professorCode, funcName, testCases, returnType)
+
+def _build_result_item(testCase, funcName: str, codeOutput, profOutput, numTestCases: int, usage: dict = None, testCaseIndex: int = None):
+    result = {
+        'isCorrect': False,
+        'code_output': '',
+        'prof_output': profOutput,
+        'test_case': testCase,
+        'test_case_index': testCaseIndex,   #Posição na lista de casos de teste (no modo smoke, os casos não rodam na ordem original)
+        'func_name': funcName,
+        'hostname': socket.gethostname(),
+        'resources': usage,   #Tempo de parede, tempo de CPU e pico de memória da execução do aluno (None se não foi medido)
+    }
+    if isinstance(codeOutput, MemoryLimitException):   #Antes de CodeException, da qual é subclasse
+        result['code_output'] = "Memory limit exceeded: O código excedeu o limite de memória."
+        status_code = 400
+    elif isinstance(codeOutput, CodeException):
+        result['code_output'] = codeOutput.message
+        status_code = 400
+    elif isinstance(codeOutput, subprocess.TimeoutExpired):
+        result['code_output'] = "Time limit exceeded: O código excedeu o tempo limite de execução."
+        result['time_limit_seconds'] = codeOutput.timeout   #Limite aplicado ao caso (pode ser o adaptativo)
+        status_code = 400
+    elif isinstance(codeOutput, Exception):
+        result['code_output'] = f"Exception error: {codeOutput}"
+        status_code = 500
     else:
-        current_directory = os.path.dirname(os.path.abspath(__file__))
-        path = os.path.join(current_directory, unique_id + "/code")
-        os.makedirs(path)
+        result['isCorrect'] = codeOutput[0]
+        result['code_output'] = codeOutput[1]
+        result['prof_output'] = codeOutput[2]
+        status_code = 200
     
-    TEMP_DIR = (Path(__file__).parent / unique_id / "code").absolute()
-    return TEMP_DIR
+    resultItem = {}
+    resultItem['result'] = result
+    resultItem['status_code'] = status_code
+    resultItem['num_test_cases'] = numTestCases   #Adicionado para fazer os testes automatizados
+    return resultItem
 
 
 @app.route('/', methods=['GET'])
@@ -80,9 +326,16 @@ def health_check_pre_process():
     return {'message': f'Endpoint para pré-processamento do código. From {socket.gethostname()}!'}, 200
     
 
-@app.route('/multi_process', methods=['POST'])    #Endpoint usado para o processamento dos códigos submetidos com multiprocessamento de todos os casos de teste
-def multi_process():
-    #logging.info("Iniciando processamento...")
+@app.route('/metrics', methods=['GET'])   #Métricas no formato texto do Prometheus
+def metrics():
+    body, contentType = latest_metrics()
+    return Response(body, content_type=contentType)
+
+@app.route('/result-cache', methods=['GET'])
+def result_cache_stats():
+    return result_cache.stats(), 200
+
+def _check_authorization():   #No GCR, apenas requisições com um ID token válido são aceitas
     if os.getenv('GCR_INSTANCE'):
         #logging.info("Running on GCR. Checking authorization.")
         #Verificação do GCR:
@@ -92,25 +345,37 @@ def multi_process():
         else:
             auth_type, creds = auth_header.split(" ", 1)
             if auth_type.lower() == "bearer":
-                google.oauth2.id_token.verify_token(creds, google.auth.transport.requests.Request())
+                get_token_verifier().verify(creds)   #Certificados e tokens já verificados ficam em cache
                 #logging.info("Authorization check passed.")
     #else:
         #logging.info("Not running on GCR. No authorization check needed.")
 
-
+def _parse_submission():
+    #Lê os campos da requisição. Retorna (submissão, None) ou (None, resposta de erro)
     if 'file' not in request.files:
         abort(400, 'Missing submission file')
         
     file = request.files['file']
+    problem, errorResponse = _parse_problem()
+    if errorResponse is not None:
+        return None, errorResponse
+    
+    if not (file and _valid_file(file.filename)):
+        abort(400, 'Invalid file')
+    
+    submission = _new_submission(problem, secure_filename(file.filename), file.read())   #O zip fica em memória: a avaliação pode continuar depois que a requisição terminou (streaming)
+    return submission, None
+
+def _parse_problem():
+    #Lê a definição do problema (linguagem, função, código do professor e casos de teste). Retorna (problema, None) ou (None, resposta de erro)
     try:
         lang = request.form.get("prog_lang")
         problem_id = request.form.get("problem_id")
         if not lang or not problem_id:
             raise Exception()
-        objLang = LanguageFactory.create_object_language(lang)
-        langExtension = objLang.langExtension
+        LanguageFactory.create_object_language(lang)   #Valida a linguagem
     except Exception:
-        return {'errorMsg': "Error: AJAX call with invalid arguments."}, 400
+        return None, ({'errorMsg': "Error: AJAX call with invalid arguments."}, 400)
     
     try:
         professorCode = request.form.get("professor_code")
@@ -136,179 +401,354 @@ def multi_process():
                 testCases.append(json.loads(teste))
                 
         
+        failFast = _parse_fail_fast(request.form.get("fail_fast", ""))
+        smokeCases = int(request.form.get("smoke_cases") or 0)
+        if failFast < 0 or smokeCases < 0:
+            raise ValueError()
     except Exception as e:
-        return {'errorMsg': "Invalid data."}, 500
+        return None, ({'errorMsg': "Invalid data."}, 500)
     
-    #Pré-processamento
-    if file and _valid_file(file.filename):
-        try:
-            TEMP_DIR = _create_temp_dir()
-            compressed_file_name = secure_filename(file.filename)
-            file.save(os.path.join(TEMP_DIR, compressed_file_name))
-        except Exception:
-            return {'errorMsg': "Error: Couldn't create temporary files."}, 500
+    problem = {
+        'lang': lang,
+        'problem_id': problem_id,
+        'professorCode': professorCode,
+        'funcName': funcName,
+        'returnType': returnType,
+        'testCases': testCases,
+        'failFast': failFast,
+        'smokeCases': smokeCases,
+    }
+    return problem, None
+
+def _parse_fail_fast(value: str):   #fail_fast=true (ou 1) para na primeira falha, fail_fast=K na K-ésima. Vazio ou 0: roda todos os casos
+    if value.lower() == "true":
+        return 1
+    if value == "" or value.lower() == "false":
+        return 0
+    return int(value)
+
+def _new_submission(problem: dict, fileName: str, archive: bytes):   #Cada submissão tem o seu próprio objeto de linguagem, que guarda o estado da avaliação
+    objLang = LanguageFactory.create_object_language(problem['lang'])
+    if _timings_requested():
+        objLang.timings = RequestTimings()
+    return {**problem, 'objLang': objLang, 'fileName': fileName, 'archive': archive}
+
+def _timings_requested():   #Depuração: o cliente pede os tempos de cada etapa com debug_timings=true
+    return request.form.get("debug_timings", "").lower() in {"true", "1"}
+
+def _zip_code(code: str):   #Empacota um código enviado como texto no mesmo formato do zip das submissões
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w") as archive:
+        archive.writestr(name_file_student, code)
+    return buffer.getvalue()
+
+def _pre_process_result(code_status: int, message: str):
+    return {
+        'pre_process_error': True,
+        'code_status': code_status,
+        'message': message,
+        'final_code': '',
+    }
 
+def _evaluate_submission(submission: dict):
+    #Avalia uma submissão gerando os registros na ordem em que ficam prontos:
+    #  ("error", (corpo, status)) - falha do servidor antes dos casos de teste
+    #  ("pre_process", resultado) - o pré-processamento rejeitou o código
+    #  ("result", resultItem) - um caso de teste concluído
+    #  ("tle", resultItem) - o caso que estourou o tempo (último registro)
+    #  ("uncacheable", motivo) - o resultado seguinte pode ter sido causado pelo ambiente (ex.: o kernel matou o processo), então a resposta não vai para o cache
+    #  ("partial", motivo) - a avaliação parou antes de rodar todos os casos (fail_fast ou smoke_cases), depois dos resultados
+    #O diretório de trabalho é devolvido ao pool mesmo se quem consome parar antes do fim
+    objLang = submission['objLang']
+    langExtension = objLang.langExtension
+    language = language_label(langExtension)
+    timings = objLang.timings
+    professorCode = submission['professorCode']
+    funcName = submission['funcName']
+    returnType = submission['returnType']
+    testCases = submission['testCases']
+    
+    #Espera uma vaga de avaliação: o número de avaliações simultâneas segue os núcleos disponíveis, não o número de threads do gunicorn
+    semaphore = get_evaluation_semaphore()
+    QUEUED_EVALUATIONS.labels(language).inc()
+    try:
+        with observe_stage(language, "queue", timings):
+            acquired = semaphore.acquire(timeout=EVALUATION_QUEUE_TIMEOUT)
+    finally:
+        QUEUED_EVALUATIONS.labels(language).dec()
+    if not acquired:
+        yield "error", ({'errorMsg': "Error: Too many evaluations in progress, try again later."}, 503)
+        return
+    
+    #Pré-processamento
+    try:
+        TEMP_DIR = _create_temp_dir()
+    except Exception:
+        semaphore.release()
+        yield "error", ({'errorMsg': "Error: Couldn't create temporary files."}, 500)
+        return
+    IN_FLIGHT_EVALUATIONS.labels(language).inc()
+    try:
+        preProcessResult = None
         try:
-            submitted_code_path = _unzip_file_codes(TEMP_DIR, compressed_file_name, langExtension, professor_code=False)
-            professor_code_path = os.path.join(os.path.dirname(submitted_code_path), name_file_professor) + langExtension
-            with open(professor_code_path, 'w') as new_file:
-                new_file.write(professorCode)
+            with observe_stage(language, "unzip", timings):   #O zip é lido em memória: só os arquivos usados na avaliação vão para o disco
+                baseCode = _read_submission_code(submission['archive'])
+                submitted_code_path = (TEMP_DIR / name_file_student).as_posix() + langExtension
+                professor_code_path = (TEMP_DIR / name_file_professor).as_posix() + langExtension
+                with open(submitted_code_path, 'w') as new_file:
+                    new_file.write(baseCode)
+                with open(professor_code_path, 'w') as new_file:
+                    new_file.write(professorCode)
             
-            objLang.evaluate_file(submitted_code_path)   #Checagem de vulnerabilidades
-            baseCode = open(submitted_code_path, "r").read()
+            with observe_stage(language, "evaluate_file", timings):
+                objLang.evaluate_file(submitted_code_path)   #Checagem de vulnerabilidades
             
-            finalCode = objLang.pre_process_code(baseCode, submitted_code_path)   #Removendo comentários do código e checando funções inválidas
+            with observe_stage(language, "pre_process_code", timings):
+                finalCode = objLang.pre_process_code(baseCode, submitted_code_path)   #Removendo comentários do código e checando funções inválidas
+        except InfrastructureException as e:   #Falha do ambiente (ex.: o Bandit não rodou), não do código
+            yield "error", ({'errorMsg': f"Error: {e.message}"}, 500)
+            return
         except PrintException as e:
-            result = {
-                'pre_process_error': True,
-                'code_status': 1,    #Código com comandos de print
-                'message': e.message,
-                'final_code': '',
-            }
-            _delete_temp_files(TEMP_DIR)
-            return result
+            preProcessResult = _pre_process_result(1, e.message)   #Código com comandos de print
         except ImportException as e:
-            result = {
-                'pre_process_error': True,
-                'code_status': 2,    #Importações inválidas
-                'message': e.message,
-                'final_code': '',
-            }
-            _delete_temp_files(TEMP_DIR)
-            return result
+            preProcessResult = _pre_process_result(2, e.message)   #Importações inválidas
         except DangerException as e:
-            result = {
-                'pre_process_error': True,
-                'code_status': 3,    #Vulnerabilidades detectadas no código
-                'message': e.message,
-                'final_code': '',
-            }
-            _delete_temp_files(TEMP_DIR)
-            return result
+            preProcessResult = _pre_process_result(3, e.message)   #Vulnerabilidades detectadas no código
         except CodeException as e:
-            result = {
-                'pre_process_error': True,
-                'code_status': 4,    #Erros no código
-                'message': e.message,
-                'final_code': '',
-            }
-            _delete_temp_files(TEMP_DIR)
-            return result
+            preProcessResult = _pre_process_result(4, e.message)   #Erros no código
         except subprocess.TimeoutExpired:
-            result = {
-                'pre_process_error': True,
-                'code_status': 5,    #TLE
-                'message': "Time limit exceeded: O código excedeu o tempo limite de execução.",
-                'final_code': '',
-            }
-            _delete_temp_files(TEMP_DIR)
-            return result
+            preProcessResult = _pre_process_result(5, "Time limit exceeded: O código excedeu o tempo limite de execução.")   #TLE
         except Exception as e:
-            _delete_temp_files(TEMP_DIR)
-            return {'errorMsg': "Error: Couldn't extract .zip file and read the code."}, 500
+            yield "error", ({'errorMsg': "Error: Couldn't extract .zip file and read the code."}, 500)
+            return
+        if preProcessResult is not None:
+            PRE_PROCESS_RESULTS.labels(language, str(preProcessResult['code_status'])).inc()
+            yield "pre_process", preProcessResult
+            return
         
         #Processamento (se o pré-processamento foi bem-sucedido)
-        funcNameProf = funcName + "_prof"
-        results = []
-
-        """
-        if(lang == "Julia"):
-            print("Iniciando o servidor DaemonMode...")
-            daemon_process = subprocess.Popen(
-                ["julia", "-e", "using DaemonMode; serve(print_stack=true)"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            time.sleep(2)
-        """
-
-        tle = False
-        #Para cada caso de teste:
-        for index, testCase in enumerate(testCases):
-            #print(testCase)
+        _prepare_test_cases(objLang, professorCode, funcName, testCases, returnType, submitted_code_path, professor_code_path)
+        failures = 0
+        rounds = _evaluation_rounds(len(testCases), submission['smokeCases'])
+        for roundNumber, indices in enumerate(rounds):
+            if roundNumber > 0 and failures > 0:   #A amostra do modo smoke falhou: os demais casos não rodam
+                yield "partial", "smoke"
+                return
+            #Para cada caso de teste:
+            outcomes = _test_case_outcomes(objLang, finalCode, professorCode, funcName, [testCases[index] for index in indices], returnType, TEMP_DIR, submitted_code_path, professor_code_path)
             try:
-                codeArgs = objLang.base_code_with_args(finalCode, name_file_professor, funcName, funcNameProf, testCase, returnType)
-                professorCodeArgs, outputProfessorCodeArgs = objLang.professor_code_with_args(professorCode, funcName, funcNameProf, testCase, returnType)   # outputProfessorCodeArgs possui o código base do professor mais a parte do output da função
-                
-                with open(submitted_code_path, 'w') as file:
-                    file.write(codeArgs)   #Escrevendo o código com os argumentos para ser testado
-                with open(professor_code_path, 'w') as file:
-                    file.write(professorCodeArgs)
-                code_output = objLang.run_code(submitted_code_path, isProfessorCode=False)
-                
-                result = {
-                    'isCorrect': code_output[0],
-                    'code_output': code_output[1],
-                    'prof_output': code_output[2],
-                    'test_case': testCase,
-                    'func_name': funcName,
-                    'hostname': socket.gethostname(),
-                }
-                status_code = 200
-
-            except CodeException as e:
-                result = {
-                    'isCorrect': False,
-                    'code_output': e.message,
-                    'prof_output': '',
-                    'test_case': testCase,
-                    'func_name': funcName,
-                    'hostname': socket.gethostname(),
-                }
-                status_code = 400
-            except subprocess.TimeoutExpired:
-                tle = True
-                result = {
-                    'isCorrect': False,
-                    'code_output': "Time limit exceeded: O código excedeu o tempo limite de execução.",
-                    'prof_output': '',
-                    'test_case': testCase,
-                    'func_name': funcName,
-                    'hostname': socket.gethostname(),
-                }
-                status_code = 400
-            except Exception as e:
-                result = {
-                    'isCorrect': False,
-                    f'code_output': "Exception error: {e}",
-                    'prof_output': '',
-                    'test_case': testCase,
-                    'func_name': funcName,
-                    'hostname': socket.gethostname(),
-                }
-                status_code = 500
-            
+                for index, (testCase, codeOutput, profOutput, usage) in zip(indices, outcomes):
+                    resultItem = _build_result_item(testCase, funcName, codeOutput, profOutput, len(testCases), usage, index)
+                    TEST_CASE_RESULTS.labels(language, str(resultItem['status_code'])).inc()
+                    if isinstance(codeOutput, KernelKillException):
+                        yield "uncacheable", "kernel_kill"
+                    if isinstance(codeOutput, subprocess.TimeoutExpired):
+                        yield "tle", resultItem
+                        return
+                    yield "result", resultItem
+                    failures += 0 if resultItem['result']['isCorrect'] else 1
+                    if submission['failFast'] and failures >= submission['failFast'] and (index != indices[-1] or roundNumber < len(rounds) - 1):
+                        yield "partial", "fail_fast"
+                        return
+            finally:
+                outcomes.close()   #Cancela os casos que ainda não começaram (modo paralelo)
+    finally:
+        IN_FLIGHT_EVALUATIONS.labels(language).dec()
+        semaphore.release()
+        with observe_stage(language, "cleanup", timings):
+            _delete_temp_files(TEMP_DIR)
+
+def _stream_records(submission: dict, sse: bool):   #Registros do endpoint de streaming (NDJSON ou server-sent events)
+    def record(event: str, payload):
+        data = app.json.dumps(payload)
+        if sse:
+            return f"event: {event}\ndata: {data}\n\n"
+        return data + "\n"
+    
+    summary = {'status': 'complete', 'num_test_cases': len(submission['testCases']), 'num_results': 0, 'num_correct': 0}
+    for kind, payload in _evaluate_submission(submission):
+        if kind == "error":
+            summary['status'] = 'error'
+            yield record("error", payload[0])
+        elif kind == "pre_process":
+            summary['status'] = 'pre_process_error'
+            yield record("pre_process", payload)
+        elif kind == "uncacheable":   #O streaming não passa pelo cache de resultados
+            continue
+        elif kind == "partial":   #Resultados parciais: num_results fica menor que num_test_cases
+            summary['status'] = 'partial'
+            summary['stop_reason'] = payload
+        else:
+            if kind == "tle":   #Como no /multi_process, só o resultado do TLE vale: o cliente descarta os anteriores
+                summary['status'] = 'time_limit_exceeded'
+            summary['num_results'] += 1
+            summary['num_correct'] += 1 if payload['result']['isCorrect'] else 0
+            yield record("result", payload)
+    summaryRecord = {'summary': summary}
+    if submission['objLang'].timings is not None:
+        summaryRecord['timings'] = submission['objLang'].timings.as_dict()
+    yield record("summary", summaryRecord)
+
+
+def _run_submission(submission: dict):
+    #Avaliação completa de uma submissão. Retorna (corpo, status http, se o corpo pode ir para o cache de resultados)
+    results = []
+    cacheable = True
+    for kind, payload in _evaluate_submission(submission):
+        if kind == "uncacheable":
+            cacheable = False
+            continue
+        if kind == "error":
+            return payload[0], payload[1], False
+        if kind == "pre_process":
+            return payload, 200, payload['code_status'] != 5   #O TLE pode ter sido causado pela carga da máquina, então não vai para o cache
+        if kind == "tle":   #TLE: apenas o resultado do caso que estourou o tempo é retornado
+            return [payload], 200, False
+        if kind == "partial":   #Menos resultados que num_test_cases. Não vai para o cache, que só guarda avaliações completas
+            return sorted(results, key=lambda resultItem: resultItem['result']['test_case_index']), 200, False
+        results.append(payload)
+    
+    results.sort(key=lambda resultItem: resultItem['result']['test_case_index'])   #No modo smoke, volta para a ordem original
+    #Erros do servidor, do ambiente ou da solução do professor nunca vão para o cache
+    cacheable = cacheable and not any(resultItem['status_code'] == 500 or resultItem['result']['prof_output'] == 'Solution code error! (durante caso de teste)' for resultItem in results)
+    return results, 200, cacheable
+
+def _submission_response_body(submission: dict):   #Corpo JSON (bytes) e status da resposta, passando pelo cache de resultados. Precisa de um app context
+    timings = submission['objLang'].timings
+    resultKey = None
+    if get_env_flag("RESULT_CACHE") and timings is None:   #Reenvio do mesmo código para o mesmo problema: devolve a resposta já calculada (com os tempos pedidos, a submissão sempre é avaliada de novo)
+        resultKey = _result_cache_key(submission['archive'], submission['lang'], submission['problem_id'], submission['professorCode'], submission['funcName'], submission['testCases'], submission['returnType'])
+        cachedBody = result_cache.get(resultKey) if resultKey is not None else None
+        if cachedBody is not None:
+            return cachedBody, 200
+    
+    body, status, cacheable = _run_submission(submission)
+    if timings is not None:   #A resposta normal vai em "response", ao lado dos tempos
+        body = {'response': body, 'timings': timings.as_dict()}
+    responseBody = jsonify(body).get_data()
+    if resultKey is not None and status == 200 and cacheable:
+        result_cache.put(resultKey, responseBody)
+    return responseBody, status
+
+
+@app.route('/multi_process', methods=['POST'])    #Endpoint usado para o processamento dos códigos submetidos com multiprocessamento de todos os casos de teste
+def multi_process():
+    _check_authorization()
+    submission, errorResponse = _parse_submission()
+    if errorResponse is not None:
+        return errorResponse
+    
+    responseBody, status = _submission_response_body(submission)
+    return app.response_class(responseBody, status=status, mimetype="application/json")
+
+@app.route('/multi_process/stream', methods=['POST'])   #Mesma avaliação do /multi_process, enviando cada resultado assim que o caso de teste termina
+def multi_process_stream():
+    _check_authorization()
+    submission, errorResponse = _parse_submission()
+    if errorResponse is not None:
+        return errorResponse
+    
+    sse = request.form.get("format") == "sse" or "text/event-stream" in request.headers.get("Accept", "")
+    mimetype = "text/event-stream" if sse else "application/x-ndjson"
+    return Response(stream_with_context(_stream_records(submission, sse)), mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+def _bulk_records(submissions: list):   #Registros NDJSON do /bulk_process, na ordem em que as submissões terminam
+    executor = ThreadPoolExecutor(max_workers=get_env_int("BULK_WORKERS", 4), thread_name_prefix="bulk")
+    
+    def evaluate(submission: dict):
+        with app.app_context():
+            return _submission_response_body(submission)
+    
+    futures = {executor.submit(evaluate, submission): submissionId for submissionId, submission in submissions}
+    summary = {'num_submissions': len(submissions), 'num_completed': 0, 'num_errors': 0}
+    try:
+        for future in as_completed(futures):
             try:
-                if status_code != 200:
-                    with open(professor_code_path, 'w') as file:
-                        file.write(outputProfessorCodeArgs)
-                    professor_code_output = objLang.run_code(professor_code_path, True)
-                    result['prof_output'] = professor_code_output
+                responseBody, status = future.result()
+                response = json.loads(responseBody)
             except Exception as e:
-                result['prof_output'] = 'Solution code error! (durante caso de teste)'
-            
-            #print(result['prof_output'])
-            resultItem = {}
-            resultItem['result'] = result
-            resultItem['status_code'] = status_code
-            resultItem['num_test_cases'] = len(testCases)   #Adicionado para fazer os testes automatizados
-            if tle:
-                results.clear()
-                results.append(resultItem)
-                break
-            results.append(resultItem)
-        """
-        if(lang == "Julia"):
-            print("Encerrando o servidor DaemonMode...")
-            daemon_process.terminate()
-            daemon_process.wait()
-        """
-
-        _delete_temp_files(TEMP_DIR)
-        return jsonify(results)
-    else:
-        abort(400, 'Invalid file')
+                response, status = {'errorMsg': f"Exception error: {e}"}, 500
+            summary['num_completed'] += 1
+            summary['num_errors'] += 1 if status != 200 else 0
+            yield app.json.dumps({'submission_id': futures[future], 'status_code': status, 'response': response}) + "\n"
+    finally:   #Cliente desconectou: as submissões que ainda não começaram são canceladas
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+    yield app.json.dumps({'summary': summary}) + "\n"
+
+@app.route('/bulk_process', methods=['POST'])   #Reavaliação de várias submissões de um mesmo problema (definido uma única vez)
+def bulk_process():
+    _check_authorization()
+    problem, errorResponse = _parse_problem()
+    if errorResponse is not None:
+        return errorResponse
+    
+    submissions = []   #(id da submissão, submissão)
+    for file in request.files.getlist('files'):   #Zips, identificados pelo nome do arquivo sem a extensão
+        if not (file and _valid_file(file.filename)):
+            abort(400, 'Invalid file')
+        fileName = secure_filename(file.filename)
+        submissions.append((Path(fileName).stem, _new_submission(problem, fileName, file.read())))
+    try:
+        for entry in json.loads(request.form.get('submissions', '[]')):   #Códigos enviados como texto: [{"id": ..., "code": ...}]
+            submissions.append((str(entry['id']), _new_submission(problem, "submission.zip", _zip_code(entry['code']))))
+    except Exception:
+        return {'errorMsg': "Invalid data."}, 500
+    if not submissions:
+        abort(400, 'Missing submission file')
+    
+    _prepare_professor_code(LanguageFactory.create_object_language(problem['lang']), problem['professorCode'], problem['funcName'])   #Prepara o estado compartilhado (ex.: objeto do professor em C) uma única vez
+    return Response(stream_with_context(_bulk_records(submissions)), mimetype="application/x-ndjson", headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _run_job(jobId: str, submission: dict):   #Executado no pool de jobs assíncronos
+    job = {'status': 'running', 'pid': os.getpid()}
+    job_store.update(jobId, job)
+    try:
+        with app.app_context():
+            responseBody, status = _submission_response_body(submission)
+        job_store.update(jobId, {**job, 'status': 'done', 'status_code': status, 'result': json.loads(responseBody)})
+    except Exception as e:
+        logging.exception(f"Job {jobId} failed")
+        job_store.update(jobId, {**job, 'status': 'failed', 'status_code': 500, 'result': {'errorMsg': f"Exception error: {e}"}})
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+_queued_jobs = threading.BoundedSemaphore(get_env_int("JOB_MAX_QUEUED", 32))   #Jobs aceitos por este processo e ainda não terminados
+
+def _get_job_executor():   #Um pool por processo do gunicorn, criado no primeiro uso
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=get_env_int("JOB_WORKERS", 2), thread_name_prefix="job")
+        return _job_executor
+
+@app.route('/jobs', methods=['POST'])   #Versão assíncrona do /multi_process: devolve um id na hora e a avaliação roda em background
+def submit_job():
+    _check_authorization()
+    submission, errorResponse = _parse_submission()
+    if errorResponse is not None:
+        return errorResponse
+    
+    job_store.sweep()
+    if not _queued_jobs.acquire(blocking=False):
+        return {'errorMsg': "Error: Too many queued jobs, try again later."}, 503
+    jobId = job_store.create()
+    future = _get_job_executor().submit(_run_job, jobId, submission)
+    future.add_done_callback(lambda _: _queued_jobs.release())
+    return {'job_id': jobId, 'status': 'queued'}, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    _check_authorization()
+    job = job_store.get(job_id)
+    if job is None:
+        return {'errorMsg': "Job not found."}, 404
+    response = {'job_id': job_id, 'status': job['status']}
+    if job['status'] in FINISHED_STATUSES:   #Mesmo corpo e status que o /multi_process teria devolvido
+        response['status_code'] = job['status_code']
+        response['result'] = job['result']
+    return response, 200
     
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from utils import get_env_flag, get_env_int, get_env_float
+import hashlib
+import threading
+
+class ReferenceRuntimeCache():   #Cache LRU do tempo de execução medido da solução do professor, por problema e linguagem
+    def __init__(self, maxSize: int):
+        self.maxSize = maxSize
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def make_key(langExtension: str, professorCode: str, funcName: str, returnType: str, testCases: list):
+        professorHash = hashlib.sha256(professorCode.encode()).hexdigest()
+        testCasesHash = hashlib.sha256("\n".join(str(testCase) for testCase in testCases).encode()).hexdigest()
+        return (langExtension, professorHash, funcName, returnType, testCasesHash)
+
+    def get(self, key):   #(encontrado, segundos). segundos é None quando a medição falhou (a solução deu erro ou TLE)
+        with self.__lock:
+            if key not in self.__entries:
+                return False, None
+            self.__entries.move_to_end(key)
+            return True, self.__entries[key]
+
+    def put(self, key, seconds):
+        if self.maxSize <= 0:
+            return
+        with self.__lock:
+            self.__entries[key] = seconds
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxSize:
+                self.__entries.popitem(last=False)
+
+
+def adaptive_time_limits_enabled():
+    return get_env_flag("ADAPTIVE_TIME_LIMIT")
+
+def adaptive_time_limit(referenceSeconds: float, defaultLimit: float):
+    #Múltiplo do tempo do professor, entre o piso e o teto. Sem medição, vale o limite padrão da linguagem
+    if referenceSeconds is None:
+        return defaultLimit
+    floor = get_env_float("ADAPTIVE_TIME_LIMIT_FLOOR", 2.0)
+    ceiling = get_env_float("ADAPTIVE_TIME_LIMIT_CEILING", defaultLimit)
+    limit = referenceSeconds * get_env_float("ADAPTIVE_TIME_LIMIT_MULTIPLIER", 10.0)
+    return round(max(floor, min(ceiling, limit)), 3)
+
+
+reference_runtime_cache = ReferenceRuntimeCache(get_env_int("REFERENCE_RUNTIME_CACHE_SIZE", 1000))
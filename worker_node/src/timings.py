@@ -0,0 +1,230 @@
+from metrics import SUBPROCESS_SPAWNS
+from exceptions import KernelKillException, MemoryLimitException
+from resourcelimits import ResourceLimits, RUSAGE_LAUNCHER, resource_usage, rss_kb
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+
+MEMORY_WATCHDOG_INTERVAL = 0.1   #Intervalo (em segundos) entre as leituras da memória de um processo vigiado (ChildProcess com memoryLimitMb)
+
+class RequestTimings():   #Tempos de uma submissão, devolvidos na resposta quando o cliente pede (debug_timings). Sem o pedido, o objeto nem é criado
+    def __init__(self):
+        self.__start = time.monotonic()
+        self.__stages = {}   #etapa -> {'count', 'seconds', 'max_seconds'}
+        self.__subprocesses = {}   #comando -> {'count', 'wall_seconds', 'user_cpu_seconds', 'system_cpu_seconds', 'max_rss_kb'}
+        self.__lock = threading.Lock()   #No modo paralelo, vários casos de teste registram ao mesmo tempo
+
+    def add_stage(self, stage: str, seconds: float):
+        with self.__lock:
+            entry = self.__stages.setdefault(stage, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+    def add_subprocess(self, command: str, wallSeconds: float, userSeconds: float = 0.0, systemSeconds: float = 0.0, maxRssKb: int = None):
+        with self.__lock:
+            entry = self.__subprocesses.setdefault(command, {'count': 0, 'wall_seconds': 0.0, 'user_cpu_seconds': 0.0, 'system_cpu_seconds': 0.0, 'max_rss_kb': None})
+            entry['count'] += 1
+            entry['wall_seconds'] += wallSeconds
+            entry['user_cpu_seconds'] += userSeconds
+            entry['system_cpu_seconds'] += systemSeconds
+            if maxRssKb is not None:   #Maior pico entre as execuções do comando
+                entry['max_rss_kb'] = max(entry['max_rss_kb'] or 0, maxRssKb)
+
+    def add_rusage(self, command: str, wallSeconds: float, rusage, maxRssKb: int = None):   #rusage: resultado do wait4 (None se o filho não pôde ser esperado). maxRssKb: ChildProcess.maxRssKb
+        if rusage is None:
+            self.add_subprocess(command, wallSeconds, maxRssKb=maxRssKb)
+        else:
+            self.add_subprocess(command, wallSeconds, rusage.ru_utime, rusage.ru_stime, maxRssKb)
+
+    def as_dict(self):
+        with self.__lock:
+            return {
+                'total_seconds': round(time.monotonic() - self.__start, 6),
+                'stages': {stage: _rounded(entry) for stage, entry in self.__stages.items()},
+                'subprocesses': {command: _rounded(entry) for command, entry in self.__subprocesses.items()},
+            }
+
+def _rounded(entry: dict):
+    return {key: round(value, 6) if isinstance(value, float) else value for key, value in entry.items()}
+
+
+def run_subprocess(command: str, args: list, timeout: float, timings: RequestTimings = None, usage: dict = None, limits: ResourceLimits = None, memoryLimitMb: int = 0):
+    #Equivale a subprocess.run(args, capture_output=True, text=True, timeout=timeout), contando o processo nas métricas.
+    #Com timings, também registra o tempo de parede, o tempo de CPU (rusage) e o pico de memória do processo. Com usage, preenche o dicionário com o uso de recursos.
+    #Com limits (código enviado), o processo roda com os rlimits: estourar o tempo de CPU gera TimeoutExpired e ser morto pelo kernel por outro motivo gera KernelKillException.
+    #Com memoryLimitMb, a memória residente do processo é vigiada (para runtimes que não sobem com RLIMIT_AS) e ultrapassá-la gera MemoryLimitException
+    SUBPROCESS_SPAWNS.labels(command).inc()
+    if limits is not None:
+        args = limits.wrap(args)
+    if timings is None and usage is None and limits is None and memoryLimitMb <= 0:
+        return subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+    result, rusage, memoryExceeded = _run_with_rusage(command, args, timeout, timings, usage, memoryLimitMb)
+    
+    if memoryExceeded:
+        raise MemoryLimitException(f"{command} exceeded the memory limit")
+    if limits is not None and result.returncode == -signal.SIGXCPU:
+        raise subprocess.TimeoutExpired(args, timeout, output=result.stdout, stderr=result.stderr)
+    if limits is not None and result.returncode == -signal.SIGKILL:   #Não foi o timeout (que gera TimeoutExpired): o limite "hard" de CPU ou o OOM killer
+        if limits.exceeded_cpu(rusage.ru_utime + rusage.ru_stime):
+            raise subprocess.TimeoutExpired(args, timeout, output=result.stdout, stderr=result.stderr)
+        raise KernelKillException(f"{command} was killed by the kernel (SIGKILL)")
+    return result
+
+
+class ChildProcess():   #Processo filho com o stdout e o stderr lidos por um selector e esperado com wait4, que também devolve o uso de recursos dele
+    def __init__(self, args: list, memoryLimitMb: int = 0):
+        #O processo é criado pelo rusage-launcher (se instalado), que informa o pid e o pico de memória do comando pelo pipe "report".
+        #memoryLimitMb: o comando é morto quando a memória residente dele passa desse valor (memoryExceeded)
+        self.args = args
+        self.returncode = None
+        self.rusage = None   #Resultado do wait4 (None até o processo ser esperado). Com o lançador, o tempo de CPU inclui o do comando, que ele espera
+        self.maxRssKb = None   #Pico de memória do comando (None sem o lançador)
+        self.memoryExceeded = False
+        self.__memoryLimitMb = memoryLimitMb
+        self.__nextMemoryCheck = 0
+        self.__buffers = {"stdout": b"", "stderr": b"", "report": b""}
+        self.__selector = selectors.DefaultSelector()
+        if RUSAGE_LAUNCHER is None:
+            self.__process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        else:
+            reportRead, reportWrite = os.pipe()
+            try:
+                self.__process = subprocess.Popen([RUSAGE_LAUNCHER, str(reportWrite), *args], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=(reportWrite,))
+            except BaseException:
+                os.close(reportRead)
+                raise
+            finally:
+                os.close(reportWrite)
+            self.__selector.register(reportRead, selectors.EVENT_READ, "report")
+        self.__selector.register(self.__process.stdout, selectors.EVENT_READ, "stdout")
+        self.__selector.register(self.__process.stderr, selectors.EVENT_READ, "stderr")
+
+    def read_line(self, deadline: float):   #Próxima linha do stdout (sem o "\n"), ou None quando o stdout fecha. Gera TimeoutExpired se ela não chegar até o deadline (time.monotonic)
+        while b"\n" not in self.__buffers["stdout"]:
+            if not self.__is_open("stdout"):
+                line, self.__buffers["stdout"] = self.__buffers["stdout"], b""
+                return line.decode(errors="replace") if line else None
+            self.__read_available(deadline)
+        line, self.__buffers["stdout"] = self.__buffers["stdout"].split(b"\n", 1)
+        return line.decode(errors="replace")
+
+    def read_all(self, deadline: float):   #Lê até o stdout e o stderr fecharem. Gera TimeoutExpired (com o que já foi lido) se isso não acontecer até o deadline
+        self.__read_until_closed(("stdout", "stderr"), deadline)
+
+    def output(self, stream: str):   #O que ainda não foi consumido do stream, como texto (com os fins de linha do subprocess.run(text=True))
+        return self.__buffers[stream].decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+    def finish(self, timeout: float = 0):   #Espera o processo terminar por até timeout segundos, matando-o depois disso, e guarda o código de saída e o rusage
+        if self.returncode is None:
+            if not self.__wait(timeout):
+                self.__stop()
+                if not self.__wait(1):   #O lançador sai logo depois de matar o comando
+                    self.__process.kill()
+            _, status, self.rusage = os.wait4(self.__process.pid, 0)
+            self.returncode = os.waitstatus_to_exitcode(status)
+            self.__process.returncode = self.returncode   #O Popen não tenta mais esperar o processo
+        deadline = time.monotonic() + 1   #Os pipes fecham junto com o processo (a não ser que um neto os tenha herdado)
+        try:
+            self.__read_until_closed(("stdout", "stderr", "report"), deadline)
+        except subprocess.TimeoutExpired:
+            pass
+        report = self.__buffers["report"].split()
+        if len(report) >= 2:
+            self.maxRssKb = int(report[1])
+        for key in list(self.__selector.get_map().values()):
+            if key.data == "report":
+                os.close(key.fd)
+        self.__selector.close()
+        self.__process.stdout.close()
+        self.__process.stderr.close()
+
+    def __wait(self, timeout: float):   #True se o processo terminou em até timeout segundos (sem esperá-lo)
+        pidfd = os.pidfd_open(self.__process.pid)
+        try:
+            with selectors.DefaultSelector() as selector:   #O pidfd fica legível quando o processo termina
+                selector.register(pidfd, selectors.EVENT_READ)
+                return bool(selector.select(max(0, timeout)))
+        finally:
+            os.close(pidfd)
+
+    def __stop(self):   #Mata o comando. O lançador recebe SIGTERM para matá-lo e ainda informar o uso de recursos dele
+        if RUSAGE_LAUNCHER is None:
+            self.__process.kill()
+        else:
+            self.__process.terminate()
+
+    def __command_pid(self):   #pid do comando (informado pelo lançador), ou None enquanto ele não é conhecido
+        if RUSAGE_LAUNCHER is None:
+            return self.__process.pid
+        if b"\n" not in self.__buffers["report"]:
+            return None
+        return int(self.__buffers["report"].split(b"\n", 1)[0])
+
+    def __check_memory(self):
+        if self.memoryExceeded or time.monotonic() < self.__nextMemoryCheck:
+            return
+        self.__nextMemoryCheck = time.monotonic() + MEMORY_WATCHDOG_INTERVAL
+        pid = self.__command_pid()
+        if pid is not None and self.returncode is None and rss_kb(pid) > self.__memoryLimitMb * 1024:
+            self.memoryExceeded = True
+            self.__stop()
+
+    def __read_until_closed(self, streams: tuple, deadline: float):
+        while any(self.__is_open(stream) for stream in streams):
+            self.__read_available(deadline)
+
+    def __is_open(self, stream: str):
+        return any(key.data == stream for key in self.__selector.get_map().values())
+
+    def __read_available(self, deadline: float):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(self.args, remaining, output=self.output("stdout"), stderr=self.output("stderr"))
+        watching = self.__memoryLimitMb > 0
+        for key, _ in self.__selector.select(min(remaining, MEMORY_WATCHDOG_INTERVAL) if watching else remaining):
+            chunk = os.read(key.fd, 65536)
+            if chunk:
+                self.__buffers[key.data] += chunk
+            else:
+                self.__selector.unregister(key.fileobj)
+                if key.data == "report":   #Os pipes do stdout e do stderr são fechados pelo Popen
+                    os.close(key.fd)
+        if watching:
+            self.__check_memory()
+
+
+class StreamedSubprocess(ChildProcess):   #Processo cujo stdout é lido linha a linha enquanto ele roda, para que quem chama aplique prazos intermediários (ex.: um por caso de teste no harness batch)
+    def __init__(self, command: str, args: list, timings: RequestTimings = None, limits: ResourceLimits = None):
+        SUBPROCESS_SPAWNS.labels(command).inc()
+        self.command = command
+        self.__timings = timings
+        self.__start = time.monotonic()
+        super().__init__(limits.wrap(args) if limits is not None else args)
+
+    def finish(self, timeout: float = 0):   #Retorna (código de saída, stderr)
+        super().finish(timeout)
+        if self.__timings is not None:
+            self.__timings.add_rusage(self.command, time.monotonic() - self.__start, self.rusage, self.maxRssKb)
+        return self.returncode, self.output("stderr")
+
+
+def _run_with_rusage(command: str, args: list, timeout: float, timings: RequestTimings, usage: dict, memoryLimitMb: int = 0):   #Retorna (CompletedProcess, rusage, memória excedida)
+    start = time.monotonic()
+    process = ChildProcess(args, memoryLimitMb)
+    deadline = start + timeout
+    try:
+        process.read_all(deadline)
+    except subprocess.TimeoutExpired as e:
+        raise subprocess.TimeoutExpired(args, timeout, output=e.output, stderr=e.stderr)
+    finally:
+        process.finish(deadline - time.monotonic())   #Depois do timeout o prazo já passou e o processo é morto
+        wallSeconds = time.monotonic() - start
+        if timings is not None:
+            timings.add_rusage(command, wallSeconds, process.rusage, process.maxRssKb)
+        if usage is not None:
+            usage.update(resource_usage(wallSeconds, process.rusage, process.maxRssKb))
+    return subprocess.CompletedProcess(args, process.returncode, process.output("stdout"), process.output("stderr")), process.rusage, process.memoryExceeded
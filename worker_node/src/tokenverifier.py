@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from utils import get_env_int
+import google.auth.jwt
+import google.auth.transport.requests
+import google.oauth2.id_token
+import email.utils
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import requests
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"   #Mesmo endpoint padrão do google.oauth2.id_token.verify_token
+MAX_AGE_REGEX = re.compile(r'max-age=(\d+)')
+MIN_REFRESH_SECONDS = 60   #Tokens com um "kid" desconhecido forçam uma nova busca no máximo uma vez nesse intervalo
+
+def certs_max_age(headers, now: float):   #Segundos de validade dos certificados segundo os cabeçalhos HTTP (Cache-Control/Age ou Expires). 0 se não podem ser guardados
+    cacheControl = headers.get("Cache-Control", "")
+    if "no-store" in cacheControl or "no-cache" in cacheControl:
+        return 0
+    match = MAX_AGE_REGEX.search(cacheControl)
+    if match:
+        try:
+            age = int(headers.get("Age", 0))
+        except ValueError:
+            age = 0
+        return max(0, int(match.group(1)) - age)
+    if headers.get("Expires"):
+        try:
+            return max(0, email.utils.parsedate_to_datetime(headers["Expires"]).timestamp() - now)
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+class TokenVerifier():   #Verificação dos ID tokens do Google sem ir à rede a cada requisição
+    def __init__(self, certsUrl: str = GOOGLE_CERTS_URL, maxTokens: int = 1024, clock = time.time, audience: str = None):
+        self.certsUrl = certsUrl
+        self.maxTokens = maxTokens
+        self.audience = audience   #"aud" exigido nos tokens (None não confere a audiência)
+        self.clock = clock   #Substituível para testes
+        self.session = requests.Session()   #Conexão reaproveitada (keep-alive) entre as buscas de certificados
+        self.__certs = None
+        self.__certsExpiry = 0.0
+        self.__certsFetchedAt = 0.0
+        self.__tokens = OrderedDict()   #hash do token -> claims, até o "exp" do token
+        self.__lock = threading.Lock()
+        self.__fetchLock = threading.Lock()   #Uma única busca de certificados por vez
+
+    def verify(self, token: str):   #Retorna as claims do token. Gera ValueError (ou google.auth.exceptions) se ele não for válido
+        tokenKey = hashlib.sha256(token.encode()).hexdigest()
+        now = self.clock()
+        with self.__lock:
+            claims = self.__tokens.get(tokenKey)
+            if claims is not None:
+                if claims['exp'] > now:
+                    self.__tokens.move_to_end(tokenKey)
+                    return claims
+                del self.__tokens[tokenKey]
+
+        certs = self.__get_certs()
+        if "keys" in certs:   #Formato JWK: usa a verificação da própria biblioteca, sem o cache dos certificados
+            claims = google.oauth2.id_token.verify_token(token, google.auth.transport.requests.Request(self.session), certs_url=self.certsUrl, audience=self.audience)
+        else:
+            keyId = google.auth.jwt.decode_header(token).get("kid")
+            if keyId is not None and keyId not in certs:   #O Google trocou as chaves antes de os certificados em cache expirarem
+                certs = self.__get_certs(refresh=True)
+            claims = google.auth.jwt.decode(token, certs=certs, audience=self.audience)
+
+        if 'exp' in claims and self.maxTokens > 0:
+            with self.__lock:
+                self.__tokens[tokenKey] = claims
+                self.__tokens.move_to_end(tokenKey)
+                while len(self.__tokens) > self.maxTokens:
+                    self.__tokens.popitem(last=False)
+        return claims
+
+    def __get_certs(self, refresh: bool = False):
+        with self.__fetchLock:
+            now = self.clock()
+            if self.__certs is not None and now < self.__certsExpiry and (not refresh or now - self.__certsFetchedAt < MIN_REFRESH_SECONDS):
+                return self.__certs
+            response = self.session.get(self.certsUrl, timeout=10)
+            response.raise_for_status()
+            self.__certs = response.json()
+            self.__certsExpiry = now + certs_max_age(response.headers, now)
+            self.__certsFetchedAt = now
+            return self.__certs
+
+
+_token_verifier = None
+_token_verifier_lock = threading.Lock()
+
+def get_token_verifier():   #Um verificador por processo do gunicorn, criado no primeiro uso
+    global _token_verifier
+    with _token_verifier_lock:
+        if _token_verifier is None:
+            _token_verifier = TokenVerifier(os.getenv("GOOGLE_CERTS_URL", GOOGLE_CERTS_URL), get_env_int("AUTH_TOKEN_CACHE_SIZE", 1024), audience=os.getenv("GOOGLE_TOKEN_AUDIENCE"))
+            logging.info(f"ID token verifier using {_token_verifier.certsUrl}")
+        return _token_verifier
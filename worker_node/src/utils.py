@@ -8,4 +8,30 @@ def is_running_in_container():
         #logging.info("Estou no container!!")
         return True
     #logging.info("Não estou no container!!")
-    return False
\ No newline at end of file
+    return False
+
+def get_env_flag(name: str, default: bool = False):   #Mesma convenção do RUNNING_IN_DOCKER: só é ativada com o valor "True"
+    return os.getenv(name, str(default)) == "True"
+
+def get_env_int(name: str, default: int):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}, using {default}")
+        return default
+
+def get_env_float(name: str, default: float):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}, using {default}")
+        return default
+
+def process_exists(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:   #Existe, mas pertence a outro usuário
+        return True
+    return True
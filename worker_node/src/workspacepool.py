@@ -0,0 +1,76 @@
+from pathlib import Path
+from utils import get_env_int, process_exists
+import os
+import re
+import shutil
+import logging
+import threading
+import uuid
+
+WORKSPACE_NAME_REGEX = re.compile(r'^ws-(\d+)-([0-9a-f]+)-\d+$')   #ws-<pid do processo>-<token do processo>-<número>
+
+class WorkspacePool():   #Diretórios de trabalho criados uma vez e reaproveitados entre as requisições deste processo
+    def __init__(self, root: Path, size: int):
+        self.root = root
+        self.size = size
+        self.__token = uuid.uuid4().hex[:8]   #Diferencia este processo de um antigo que tinha o mesmo pid
+        self.__counter = 0
+        self.__idle = []
+        self.__lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.sweep_orphans()
+        for _ in range(size):
+            self.__idle.append(self.__create())
+
+    def checkout(self):   #Retorna o diretório "code" vazio de um workspace
+        with self.__lock:
+            if self.__idle:
+                return self.__idle.pop()
+        return self.__create()
+
+    def release(self, codeDir: Path):   #Apaga todo o conteúdo de uma vez e devolve o workspace ao pool
+        try:
+            shutil.rmtree(codeDir)
+            codeDir.mkdir()
+            with self.__lock:
+                if len(self.__idle) < self.size:
+                    self.__idle.append(codeDir)
+                    return
+            shutil.rmtree(codeDir.parent)
+        except OSError as e:   #Workspace em estado inesperado: descarta em vez de reaproveitar
+            logging.warning(f"Couldn't recycle workspace {codeDir}: {e}")
+            shutil.rmtree(codeDir.parent, ignore_errors=True)
+
+    def sweep_orphans(self):   #Remove workspaces deixados por processos do gunicorn que morreram
+        for entry in os.scandir(self.root):
+            match = WORKSPACE_NAME_REGEX.match(entry.name)
+            if not match:
+                continue
+            pid, token = int(match.group(1)), match.group(2)
+            if pid == os.getpid():
+                orphan = token != self.__token
+            else:
+                orphan = not process_exists(pid)
+            if orphan:
+                logging.info(f"Removing orphaned workspace {entry.path}")
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def __create(self):
+        with self.__lock:
+            self.__counter += 1
+            name = f"ws-{os.getpid()}-{self.__token}-{self.__counter}"
+        codeDir = self.root / name / "code"   #Mesmo formato <id>/code dos diretórios temporários (usado nas mensagens de erro do Julia)
+        codeDir.mkdir(parents=True)
+        return codeDir
+
+
+_workspace_pool = None
+_workspace_pool_lock = threading.Lock()
+
+def get_workspace_pool():   #Um pool por processo do gunicorn, criado no primeiro uso
+    global _workspace_pool
+    with _workspace_pool_lock:
+        if _workspace_pool is None:
+            root = Path(os.getenv("WORKSPACE_ROOT", Path(__file__).parent / "workspaces")).absolute()   #De preferência um tmpfs, para não passar pelo overlay do container
+            _workspace_pool = WorkspacePool(root, get_env_int("WORKSPACE_POOL_SIZE", 4))
+        return _workspace_pool
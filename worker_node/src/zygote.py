@@ -0,0 +1,257 @@
+#Executor de Python pré-aquecido (zygote). Um processo "python3 zygote.py" já com os módulos do harness importados recebe pedidos pelo stdin
+#e faz um fork para cada execução, evitando o custo de iniciar um interpretador novo por caso de teste.
+#Protocolo (uma linha JSON por mensagem):
+#  servidor -> zygote: {"id": 1, "file": "/caminho/run_me.py", "timeout": 10, "limits": {"cpu_seconds": 11, "memory_mb": 1024, "max_processes": 0}}
+#  (limits são os do execution_limits, ou null com EXECUTION_LIMITS=False; 0 desativa o limite)
+#  zygote -> servidor: {"id": 1, "stdout": "...", "stderr": "...", "returncode": 0, "timeout": false, "rusage": [cpu de usuário, cpu de sistema, pico de memória em KB]}
+import os
+import sys
+import json
+import atexit
+import time
+import signal
+import resource
+import selectors
+import tempfile
+import traceback
+import runpy
+import subprocess
+import threading
+from exceptions import WorkerException, KernelKillException, InfrastructureException
+#Módulos usados pelo harness e pelos códigos mais comuns, importados uma única vez no zygote
+import math
+import re
+import collections
+import itertools
+import functools
+
+ZYGOTE_SCRIPT = os.path.abspath(__file__)
+
+def _run_child(file_path: str, stdoutFile, stderrFile, limits: dict):   #Executado no processo filho, nunca retorna
+    try:
+        os.setpgid(0, 0)   #Grupo próprio para que o timeout mate também qualquer processo criado pelo código
+        _reset_peak_rss()
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(stdoutFile.fileno(), 1)
+        os.dup2(stderrFile.fileno(), 2)
+        os.closerange(3, 65536)   #Fecha o pipe do protocolo e os demais descritores herdados do zygote
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        if limits is not None:   #Os mesmos limites que o prlimit aplicaria (ResourceLimits.wrap)
+            if limits["cpu_seconds"] > 0:
+                resource.setrlimit(resource.RLIMIT_CPU, (limits["cpu_seconds"], limits["cpu_seconds"] + 1))   #SIGXCPU (tratado como TLE) antes do SIGKILL
+            if limits["memory_mb"] > 0:
+                resource.setrlimit(resource.RLIMIT_AS, (limits["memory_mb"] * 1024 * 1024, limits["memory_mb"] * 1024 * 1024))
+            if limits["max_processes"] > 0:
+                resource.setrlimit(resource.RLIMIT_NPROC, (limits["max_processes"], limits["max_processes"]))
+        os.chdir(os.path.dirname(file_path))
+        sys.path[0] = os.path.dirname(file_path)   #Igual ao "python3 arquivo.py": o diretório do arquivo é o primeiro do sys.path
+        sys.argv = [file_path]
+    except BaseException:
+        os._exit(70)
+
+    exitCode = 0
+    try:
+        runpy.run_path(file_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            exitCode = 0
+        elif isinstance(e.code, int):
+            exitCode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exitCode = 1
+    except SyntaxError as e:   #O interpretador mostra apenas a parte do erro de sintaxe, sem o traceback do runpy
+        traceback.print_exception(type(e), e, None)
+        exitCode = 1
+    except BaseException as e:
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != file_path:   #Remove os frames do runpy, como no traceback do interpretador
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb)
+        exitCode = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exitCode)
+
+def _reset_peak_rss():
+    #O filho herda o pico de memória do zygote no fork. Zerar o pico (clear_refs) faz o ru_maxrss partir da memória residente atual, ou seja,
+    #do interpretador com os módulos já importados, como um "python3" recém-iniciado
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+def _read_output(file):
+    file.seek(0)
+    output = file.read().decode(errors="replace")
+    file.close()
+    return output
+
+def serve():
+    protocolOut = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)   #Nada além das respostas do protocolo pode ir para o pipe
+    selector = selectors.DefaultSelector()
+    selector.register(0, selectors.EVENT_READ, None)
+    pending = b""
+    running = {}   #pidfd -> (id, pid, stdoutFile, stderrFile, deadline)
+
+    def respond(jobId, stdout, stderr, returncode, timedOut, rusage):
+        usage = [rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss]   #Tempo de CPU de usuário e de sistema e pico de memória do filho (a partir do _reset_peak_rss)
+        protocolOut.write(json.dumps({"id": jobId, "stdout": stdout, "stderr": stderr, "returncode": returncode, "timeout": timedOut, "rusage": usage}) + "\n")
+        protocolOut.flush()
+
+    def finish(pidfd, timedOut):
+        jobId, pid, stdoutFile, stderrFile, deadline = running.pop(pidfd)
+        selector.unregister(pidfd)
+        if timedOut:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        _, status, rusage = os.wait4(pid, 0)
+        os.close(pidfd)
+        respond(jobId, _read_output(stdoutFile), _read_output(stderrFile), os.waitstatus_to_exitcode(status), timedOut, rusage)
+
+    while True:
+        timeout = None
+        if running:
+            timeout = max(0, min(job[4] for job in running.values()) - time.monotonic())
+        for key, _ in selector.select(timeout):
+            if key.fileobj == 0:
+                chunk = os.read(0, 65536)
+                if not chunk:   #O servidor fechou o pipe
+                    for pidfd in list(running):
+                        finish(pidfd, True)
+                    return
+                pending += chunk
+                while b"\n" in pending:
+                    line, pending = pending.split(b"\n", 1)
+                    request = json.loads(line)
+                    stdoutFile = tempfile.TemporaryFile()
+                    stderrFile = tempfile.TemporaryFile()
+                    protocolOut.flush()
+                    pid = os.fork()
+                    if pid == 0:
+                        _run_child(request["file"], stdoutFile, stderrFile, request["limits"])
+                    pidfd = os.pidfd_open(pid)
+                    running[pidfd] = (request["id"], pid, stdoutFile, stderrFile, time.monotonic() + request["timeout"])
+                    selector.register(pidfd, selectors.EVENT_READ, None)
+            else:
+                finish(key.fileobj, False)
+        now = time.monotonic()
+        for pidfd in [pidfd for pidfd, job in running.items() if job[4] <= now]:
+            finish(pidfd, True)
+
+
+
+class ZygoteExecutor():   #Lado do servidor: mantém o zygote vivo e despacha as execuções (pode ser usado por várias threads)
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__process = None
+        self.__nextId = 0
+        self.__waiting = {}   #id -> (evento, resposta)
+
+    def run_file(self, file_path: str, timeout: float, timings = None, usage: dict = None, limits = None):
+        #Retorna (stdout, stderr) como o subprocess.run retornaria. timings: RequestTimings da submissão, se pedido. usage recebe o uso de recursos do filho.
+        #limits: ResourceLimits aplicados pelo zygote no filho (None executa sem rlimits, como com o prlimit)
+        #Gera WorkerException apenas se o pedido não chegou ao zygote (quem chama pode rodar o código em outro processo). Depois do envio, o código
+        #pode ter rodado: sem resposta a tempo é TLE, e o zygote que morreu gera InfrastructureException
+        start = time.monotonic()
+        event = threading.Event()
+        slot = {}
+        request = {"id": None, "file": os.path.abspath(file_path), "timeout": timeout, "limits": None}
+        if limits is not None:
+            request["limits"] = {"cpu_seconds": limits.cpuSeconds, "memory_mb": limits.memoryMb, "max_processes": limits.maxProcesses}
+        with self.__lock:
+            if self.__process is None or self.__process.poll() is not None:
+                self.__start()
+            self.__nextId += 1
+            jobId = self.__nextId
+            self.__waiting[jobId] = (event, slot)
+            request["id"] = jobId
+            process = self.__process
+            try:
+                self.__process.stdin.write(json.dumps(request) + "\n")
+                self.__process.stdin.flush()
+            except OSError as e:
+                self.__waiting.pop(jobId, None)
+                raise WorkerException(f"Python zygote pipe closed: {e}")
+        
+        if not event.wait(timeout + 5):   #O próprio zygote mata o filho no tempo limite: sem resposta, ele está travado e é substituído
+            with self.__lock:
+                self.__waiting.pop(jobId, None)
+            process.kill()
+            process.wait()   #O próximo pedido já encontra o processo morto e sobe outro zygote
+            raise subprocess.TimeoutExpired(["python3", file_path], timeout)
+        response = slot.get("response")
+        if response is None:
+            raise InfrastructureException("Python zygote exited while running the code")
+        wallSeconds = time.monotonic() - start
+        userSeconds, systemSeconds, maxRss = response["rusage"]
+        if timings is not None:
+            timings.add_subprocess("python_fork", wallSeconds, userSeconds, systemSeconds, maxRss)
+        if usage is not None:
+            usage.update({'wall_seconds': round(wallSeconds, 6), 'cpu_seconds': round(userSeconds + systemSeconds, 6), 'max_rss_kb': maxRss})
+        if response["timeout"] or response["returncode"] == -signal.SIGXCPU:
+            raise subprocess.TimeoutExpired(["python3", file_path], timeout, output=response["stdout"].encode())
+        if response["returncode"] == -signal.SIGKILL:   #Não foi o timeout: o limite "hard" de CPU ou o OOM killer
+            if limits is not None and limits.exceeded_cpu(userSeconds + systemSeconds):
+                raise subprocess.TimeoutExpired(["python3", file_path], timeout, output=response["stdout"].encode())
+            raise KernelKillException("python_fork was killed by the kernel (SIGKILL)")
+        return response["stdout"], response["stderr"]
+
+    def shutdown(self):
+        with self.__lock:
+            if self.__process is not None:
+                self.__process.kill()
+                self.__process.wait()
+
+    def __start(self):
+        self.__process = subprocess.Popen(
+            ["python3", ZYGOTE_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        threading.Thread(target=self.__read_responses, args=(self.__process,), daemon=True).start()
+
+    def __read_responses(self, process):
+        for line in process.stdout:
+            response = json.loads(line)
+            with self.__lock:
+                entry = self.__waiting.pop(response["id"], None)
+            if entry is not None:
+                entry[1]["response"] = response
+                entry[0].set()
+        process.kill()   #O stdout fecha antes de o poll() ver o processo terminado: sem esperá-lo, o próximo pedido iria para o zygote morto
+        process.wait()
+        with self.__lock:   #O zygote morreu: libera quem ainda espera por ele
+            if self.__process is process:
+                waiting, self.__waiting = self.__waiting, {}
+            else:
+                waiting = {}
+        for event, slot in waiting.values():
+            event.set()
+
+
+_zygote_executor = None
+_zygote_executor_lock = threading.Lock()
+
+def get_zygote_executor():   #Um zygote por processo do gunicorn, criado no primeiro uso
+    global _zygote_executor
+    with _zygote_executor_lock:
+        if _zygote_executor is None:
+            _zygote_executor = ZygoteExecutor()
+            atexit.register(_zygote_executor.shutdown)
+        return _zygote_executor
+
+
+if __name__ == "__main__":
+    serve()
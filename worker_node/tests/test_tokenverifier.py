@@ -0,0 +1,122 @@
+#Testes do tokenverifier.py com um servidor local de certificados, sem acesso à rede. Rodar a partir de worker_node:
+#  python -m unittest discover -s tests
+from pathlib import Path
+from unittest import mock
+import http.server
+import json
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))   #Os módulos do worker são importados pelo nome, como no servidor
+
+from google.auth import crypt, jwt
+from tokenverifier import TokenVerifier, MIN_REFRESH_SECONDS
+import rsa
+
+CERTS_MAX_AGE = 300
+CERTS_AGE = 10   #Os certificados valem CERTS_MAX_AGE - CERTS_AGE segundos depois da busca
+
+class CertsHandler(http.server.BaseHTTPRequestHandler):   #Serve os certificados no mesmo formato (e com os mesmos cabeçalhos de cache) do endpoint do Google
+    protocol_version = "HTTP/1.1"
+    certs = {}
+    fetches = []
+
+    def do_GET(self):
+        self.fetches.append(self.path)
+        body = json.dumps(self.certs).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", f"public, max-age={CERTS_MAX_AGE}")
+        self.send_header("Age", str(CERTS_AGE))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TokenVerifierTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        publicKey, privateKey = rsa.newkeys(1024)   #Chaves pequenas só para o teste ser rápido (o rsa é Python puro)
+        _, otherPrivateKey = rsa.newkeys(1024)
+        CertsHandler.certs = {"k1": publicKey.save_pkcs1().decode()}
+        cls.signer = crypt.RSASigner.from_string(privateKey.save_pkcs1().decode(), key_id="k1")
+        cls.forgedSigner = crypt.RSASigner.from_string(otherPrivateKey.save_pkcs1().decode(), key_id="k1")   #Mesmo "kid", chave errada
+        cls.unknownKeySigner = crypt.RSASigner.from_string(otherPrivateKey.save_pkcs1().decode(), key_id="k2")
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CertsHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.certsUrl = f"http://127.0.0.1:{cls.server.server_port}/certs"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        CertsHandler.fetches.clear()
+        self.now = time.time()   #Relógio do verificador, avançado pelos testes (o "exp" e o "iat" são conferidos pela biblioteca com o relógio real)
+        self.verifier = TokenVerifier(self.certsUrl, clock=lambda: self.now)
+
+    def token(self, signer = None, **claims):
+        issuedAt = int(time.time())
+        payload = {"iss": "https://accounts.google.com", "sub": "student", "iat": issuedAt, "exp": issuedAt + 3600}
+        payload.update(claims)
+        return jwt.encode(signer or self.signer, payload).decode()
+
+    def test_verified_token_is_cached(self):
+        token = self.token()
+        with mock.patch("google.auth.jwt.decode", wraps=jwt.decode) as decode:
+            self.assertEqual(self.verifier.verify(token)["sub"], "student")
+            self.assertEqual(self.verifier.verify(token)["sub"], "student")
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(len(CertsHandler.fetches), 1)
+
+    def test_certs_are_reused_until_they_expire(self):
+        self.verifier.verify(self.token(sub="a"))
+        self.now += CERTS_MAX_AGE - CERTS_AGE - 1
+        self.verifier.verify(self.token(sub="b"))
+        self.assertEqual(len(CertsHandler.fetches), 1)
+        self.now += 2
+        self.verifier.verify(self.token(sub="c"))
+        self.assertEqual(len(CertsHandler.fetches), 2)
+
+    def test_cached_token_expires(self):
+        token = self.token(exp=int(time.time()) + 60)
+        with mock.patch("google.auth.jwt.decode", wraps=jwt.decode) as decode:
+            self.verifier.verify(token)
+            self.now += 61   #Passou do "exp": o token sai do cache e é verificado de novo
+            self.verifier.verify(token)
+        self.assertEqual(decode.call_count, 2)
+
+    def test_rejects_bad_signature(self):
+        with self.assertRaises(ValueError):
+            self.verifier.verify(self.token(self.forgedSigner))
+        with self.assertRaises(ValueError):   #Um token rejeitado não entra no cache
+            self.verifier.verify(self.token(self.forgedSigner))
+
+    def test_unknown_key_refreshes_certs_at_most_once(self):
+        self.verifier.verify(self.token())
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.verifier.verify(self.token(self.unknownKeySigner))
+        self.assertEqual(len(CertsHandler.fetches), 1)   #A busca com os certificados ainda válidos foi há menos de MIN_REFRESH_SECONDS
+        self.now += MIN_REFRESH_SECONDS
+        with self.assertRaises(ValueError):
+            self.verifier.verify(self.token(self.unknownKeySigner))
+        self.assertEqual(len(CertsHandler.fetches), 2)
+
+    def test_rejects_wrong_audience(self):
+        verifier = TokenVerifier(self.certsUrl, clock=lambda: self.now, audience="machine-teaching-worker")
+        self.assertEqual(verifier.verify(self.token(aud="machine-teaching-worker"))["aud"], "machine-teaching-worker")
+        with self.assertRaises(ValueError):
+            verifier.verify(self.token(aud="another-service"))
+        with self.assertRaises(ValueError):
+            verifier.verify(self.token())
+
+
+if __name__ == "__main__":
+    unittest.main()